@@ -27,6 +27,9 @@ import plover.steno_dictionary as steno_dictionary
 import plover.steno as steno
 import plover.translation as translation
 from plover.dictionary.base import load_dictionary
+from plover.dictionary.base import read_changes, apply_changes
+from plover.dictionary.base import close_dictionary, written_by_plover
+from plover.dictionary.watcher import DictionaryWatcher
 from plover.exception import InvalidConfigurationError,DictionaryLoaderException
 import plover.dictionary.json_dict as json_dict
 import plover.dictionary.rtfcre_dict as rtfcre_dict
@@ -48,12 +51,17 @@ def init_engine(engine, config):
     """Initialize a StenoEngine from a config object."""
     reset_machine(engine, config)
     
+    set_loading_processes(config.get_dictionary_loading_processes())
     dictionary_file_names = config.get_dictionary_file_names()
-    try:
-        dicts = dict_manager.load(dictionary_file_names)
-    except DictionaryLoaderException as e:
-        raise InvalidConfigurationError(unicode(e))
-    engine.get_dictionary().set_dicts(dicts)
+    if config.get_progressive_dictionary_loading():
+        load_dictionaries_progressively(engine, dictionary_file_names)
+    else:
+        try:
+            dicts = dict_manager.load(dictionary_file_names)
+        except DictionaryLoaderException as e:
+            raise InvalidConfigurationError(unicode(e))
+        engine.get_dictionary().set_dicts(dicts)
+    engine.dictionary_watcher.set_files(dictionary_file_names)
 
     log_file_name = config.get_log_file_name()
     if log_file_name:
@@ -62,9 +70,29 @@ def init_engine(engine, config):
     engine.enable_stroke_logging(config.get_enable_stroke_logging())
     engine.enable_translation_logging(config.get_enable_translation_logging())
     engine.set_space_placement(config.get_space_placement())
+    engine.set_fold_keys(config.get_suffix_fold_keys().split(),
+                         config.get_prefix_fold_keys().split())
     
     engine.set_is_running(config.get_auto_start())
 
+def load_dictionaries_progressively(engine, filenames):
+    """Start translating before all the dictionaries have loaded.
+
+    Each dictionary is added to the engine's collection as soon as it is ready
+    so small, high priority dictionaries are usable right away. Failures are
+    recorded in the collection's load states instead of being raised, and
+    passed on to its load listeners.
+
+    """
+    collection = engine.get_dictionary()
+    collection.set_loading(filenames)
+    def loaded(filename, d, exception):
+        if exception:
+            engine.thread_hook(collection.set_load_failed, filename, exception)
+        else:
+            engine.thread_hook(collection.add_loaded_dict, d)
+    dict_manager.load_progressively(filenames, loaded)
+
 def reset_machine(engine, config):
     """Set the machine on the engine based on config."""
     machine_type = config.get_machine_type()
@@ -75,6 +103,16 @@ def reset_machine(engine, config):
         raise InvalidConfigurationError(unicode(e))
     engine.set_machine(instance)
 
+def set_loading_processes(processes):
+    """Use worker processes to load dictionaries and convert big RTF files.
+
+    Worker processes are forked from the loading threads, which is not safe on
+    every platform, so they are only used when configured.
+
+    """
+    dict_manager.set_processes(processes)
+    rtfcre_dict.processes = processes
+
 def update_engine(engine, old, new):
     """Modify a StenoEngine using a before and after config object.
     
@@ -91,13 +129,18 @@ def update_engine(engine, old, new):
             raise InvalidConfigurationError(unicode(e))
         engine.set_machine(machine_class(machine_options))
 
+    set_loading_processes(new.get_dictionary_loading_processes())
     dictionary_file_names = new.get_dictionary_file_names()
     if old.get_dictionary_file_names() != dictionary_file_names:
-        try:
-            dicts = dict_manager.load(dictionary_file_names)
-        except DictionaryLoaderException as e:
-            raise InvalidConfigurationError(unicode(e))
-        engine.get_dictionary().set_dicts(dicts)
+        if new.get_progressive_dictionary_loading():
+            load_dictionaries_progressively(engine, dictionary_file_names)
+        else:
+            try:
+                dicts = dict_manager.load(dictionary_file_names)
+            except DictionaryLoaderException as e:
+                raise InvalidConfigurationError(unicode(e))
+            engine.get_dictionary().set_dicts(dicts)
+        engine.dictionary_watcher.set_files(dictionary_file_names)
 
     log_file_name = new.get_log_file_name()
     if old.get_log_file_name() != log_file_name:
@@ -115,6 +158,12 @@ def update_engine(engine, old, new):
     if old.get_space_placement() != space_placement:
         engine.set_space_placement(space_placement)
 
+    suffix_fold_keys = new.get_suffix_fold_keys()
+    prefix_fold_keys = new.get_prefix_fold_keys()
+    if (old.get_suffix_fold_keys() != suffix_fold_keys or
+        old.get_prefix_fold_keys() != prefix_fold_keys):
+        engine.set_fold_keys(suffix_fold_keys.split(), prefix_fold_keys.split())
+
 def same_thread_hook(fn, *args):
     fn(*args)
 
@@ -157,6 +206,9 @@ class StenoEngine(object):
         self.machine = None
         self.thread_hook = thread_hook
 
+        self.dictionary_watcher = DictionaryWatcher(
+            self._dictionary_file_changed)
+
         self.translator = translation.Translator()
         self.formatter = formatting.Formatter()
         self.logger = Logger()
@@ -225,6 +277,7 @@ class StenoEngine(object):
         """
         if self.machine:
             self.machine.stop_capture()
+        self.dictionary_watcher.stop()
         self.is_running = False
 
     def add_callback(self, callback):
@@ -248,6 +301,10 @@ class StenoEngine(object):
     def set_space_placement(self, s):
         """Set whether spaces will be inserted before the output or after the output."""
         self.formatter.set_space_placement(s)
+
+    def set_fold_keys(self, suffix_keys, prefix_keys):
+        """Set the keys that can be folded into the last or first stroke."""
+        self.translator.set_fold_keys(suffix_keys, prefix_keys)
         
     def enable_translation_logging(self, b):
         """Turn translation logging on or off."""
@@ -260,11 +317,44 @@ class StenoEngine(object):
         self.stroke_listeners.remove(listener)
 
     def _translate_stroke(self, s):
-        stroke = steno.Stroke(s)
+        stroke = steno.Stroke.from_keys(s)
         self.translator.translate(stroke)
         for listener in self.stroke_listeners:
             listener(stroke)
 
+    def _dictionary_file_changed(self, filename):
+        # Called from the watcher's thread so that parsing the file and
+        # comparing it doesn't hold up translation. Only the changed entries
+        # are applied, in place, so the translator keeps its undo state.
+        if written_by_plover(filename):
+            return
+        for d in self.get_dictionary().dicts:
+            if d.get_path() != filename:
+                continue
+            try:
+                if d.in_memory:
+                    changes = read_changes(d, filename)
+                    if changes:
+                        self.thread_hook(apply_changes, d, changes)
+                elif hasattr(d, 'refresh'):
+                    # Lookups already go to the file.
+                    self.thread_hook(d.refresh)
+                else:
+                    new = load_dictionary(filename)
+                    new.set_path(filename)
+                    self.thread_hook(self._replace_dictionary, d, new)
+            except DictionaryLoaderException:
+                # Most likely read while it was being written. The write will
+                # be picked up as another change.
+                pass
+
+    def _replace_dictionary(self, old, new):
+        if self.get_dictionary().replace_dict(old, new):
+            close_dictionary(old)
+        else:
+            # Dropped while its file was being read.
+            close_dictionary(new)
+
     def _translator_machine_callback(self, s):
         self.thread_hook(self._translate_stroke, s)
 
@@ -28,6 +28,12 @@ DICTIONARY_CONFIG_SECTION = 'Dictionary Configuration'
 DICTIONARY_FILE_OPTION = 'dictionary_file'
 DEFAULT_DICTIONARY_FILE = os.path.join(CONFIG_DIR, 'dict.json')
 
+DICTIONARY_LOADING_SECTION = 'Dictionary Loading'
+DICTIONARY_LOADING_PROCESSES_OPTION = 'processes'
+DEFAULT_DICTIONARY_LOADING_PROCESSES = 0
+DICTIONARY_LOADING_PROGRESSIVE_OPTION = 'progressive'
+DEFAULT_DICTIONARY_LOADING_PROGRESSIVE = False
+
 LOGGING_CONFIG_SECTION = 'Logging Configuration'
 LOG_FILE_OPTION = 'log_file'
 DEFAULT_LOG_FILE = os.path.join(CONFIG_DIR, 'plover.log')
@@ -52,6 +58,12 @@ OUTPUT_CONFIG_SECTION = 'Output Configuration'
 OUTPUT_CONFIG_SPACE_PLACEMENT_OPTION = 'space_placement'
 DEFAULT_OUTPUT_CONFIG_SPACE_PLACEMENT = 'Before Output'
 
+TRANSLATION_CONFIG_SECTION = 'Translation Configuration'
+SUFFIX_FOLD_KEYS_OPTION = 'suffix_fold_keys'
+DEFAULT_SUFFIX_FOLD_KEYS = '-S -G -Z -D'
+PREFIX_FOLD_KEYS_OPTION = 'prefix_fold_keys'
+DEFAULT_PREFIX_FOLD_KEYS = ''
+
 CONFIG_FRAME_SECTION = 'Config Frame'
 CONFIG_FRAME_X_OPTION = 'x'
 DEFAULT_CONFIG_FRAME_X = -1
@@ -101,6 +113,8 @@ DEFAULT_KEYBOARD_CONFIG_FRAME_Y = -1
 # Dictionary constants.
 JSON_EXTENSION = '.json'
 RTF_EXTENSION = '.rtf'
+MMAP_EXTENSION = '.mdict'
+SQLITE_EXTENSION = '.sqlite'
 
 # Logging constants.
 LOG_EXTENSION = '.log'
@@ -187,6 +201,24 @@ class Config(object):
             filenames = [DEFAULT_DICTIONARY_FILE]
         return filenames
 
+    def set_dictionary_loading_processes(self, processes):
+        self._set(DICTIONARY_LOADING_SECTION, 
+                  DICTIONARY_LOADING_PROCESSES_OPTION, processes)
+
+    def get_dictionary_loading_processes(self):
+        return self._get_int(DICTIONARY_LOADING_SECTION, 
+                             DICTIONARY_LOADING_PROCESSES_OPTION,
+                             DEFAULT_DICTIONARY_LOADING_PROCESSES)
+
+    def set_progressive_dictionary_loading(self, b):
+        self._set(DICTIONARY_LOADING_SECTION, 
+                  DICTIONARY_LOADING_PROGRESSIVE_OPTION, b)
+
+    def get_progressive_dictionary_loading(self):
+        return self._get_bool(DICTIONARY_LOADING_SECTION, 
+                              DICTIONARY_LOADING_PROGRESSIVE_OPTION,
+                              DEFAULT_DICTIONARY_LOADING_PROGRESSIVE)
+
     def set_log_file_name(self, filename):
         self._set(LOGGING_CONFIG_SECTION, LOG_FILE_OPTION, filename)
 
@@ -231,6 +263,20 @@ class Config(object):
     def set_space_placement(self, s):
         self._set(OUTPUT_CONFIG_SECTION, OUTPUT_CONFIG_SPACE_PLACEMENT_OPTION, s)
 
+    def get_suffix_fold_keys(self):
+        return self._get(TRANSLATION_CONFIG_SECTION, SUFFIX_FOLD_KEYS_OPTION,
+                         DEFAULT_SUFFIX_FOLD_KEYS)
+
+    def set_suffix_fold_keys(self, keys):
+        self._set(TRANSLATION_CONFIG_SECTION, SUFFIX_FOLD_KEYS_OPTION, keys)
+
+    def get_prefix_fold_keys(self):
+        return self._get(TRANSLATION_CONFIG_SECTION, PREFIX_FOLD_KEYS_OPTION,
+                         DEFAULT_PREFIX_FOLD_KEYS)
+
+    def set_prefix_fold_keys(self, keys):
+        self._set(TRANSLATION_CONFIG_SECTION, PREFIX_FOLD_KEYS_OPTION, keys)
+
     def set_stroke_display_on_top(self, b):
         self._set(STROKE_DISPLAY_SECTION, STROKE_DISPLAY_ON_TOP_OPTION, b)
 
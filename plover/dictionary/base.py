@@ -7,39 +7,154 @@
 
 """Common elements to all dictionary formats."""
 
+import logging
+import os
 from os.path import splitext
 import shutil
 import threading
+import time
 
 import plover.dictionary.json_dict as json_dict
 import plover.dictionary.rtfcre_dict as rtfcre_dict
-from plover.config import JSON_EXTENSION, RTF_EXTENSION, CONFIG_DIR
+import plover.dictionary.mmap_dict as mmap_dict
+import plover.dictionary.sqlite_dict as sqlite_dict
+from plover.dictionary.cache import DictionaryCache
+from plover.dictionary.journal import DictionaryJournal
+from plover.dictionary.watcher import file_signature
+from plover.steno_dictionary import StenoDictionary
+from plover.config import JSON_EXTENSION, RTF_EXTENSION, MMAP_EXTENSION
+from plover.config import SQLITE_EXTENSION
+from plover.config import CONFIG_DIR
 from plover.exception import DictionaryLoaderException
+from plover.logger import LOGGER_NAME
 
 dictionaries = {
     JSON_EXTENSION.lower(): json_dict,
     RTF_EXTENSION.lower(): rtfcre_dict,
+    MMAP_EXTENSION.lower(): mmap_dict,
+    SQLITE_EXTENSION.lower(): sqlite_dict,
 }
 
-def load_dictionary(filename):
-    """Load a dictionary from a file."""
+# Compiled dictionaries are kept here so that unchanged files don't need to be
+# parsed again. Set to None to disable caching.
+dictionary_cache = DictionaryCache(os.path.join(CONFIG_DIR, 'cache'))
+
+def _dictionary_type(filename):
     extension = splitext(filename)[1].lower()
     
     try:
-        dict_type = dictionaries[extension]
+        return dictionaries[extension]
     except KeyError:
         raise DictionaryLoaderException(
             'Unsupported extension for dictionary: %s. Supported extensions: %s' %
             (extension, ', '.join(dictionaries.keys())))
 
-    loader = dict_type.load_dictionary
+def load_dictionary(filename, background=True):
+    """Load a dictionary from a file.
+
+    Arguments:
+
+    filename -- The dictionary file.
+
+    background -- Whether the cache may be updated by a background thread. It
+    must be False in processes that may exit as soon as this returns.
+
+    """
+    dict_type = _dictionary_type(filename)
+
+    # Formats that read their files in place don't need parsing or caching.
+    if hasattr(dict_type, 'open_dictionary'):
+        return dict_type.open_dictionary(filename)
 
+    d = _parse_dictionary(filename, dict_type, background)
+    d.save = ThreadedSaver(d, filename, dict_type.save_dictionary)
+    return d
+
+def _parse_dictionary(filename, dict_type, background=True):
+    cache = dictionary_cache
+    d = None
+    # Taken before the file is read, so a change made while reading it makes
+    # the cache stale rather than attaching the old contents to the new time.
     try:
-        with open(filename, 'rb') as f:
-            d = loader(f.read())
-    except IOError as e:
+        st = os.stat(filename)
+    except OSError as e:
         raise DictionaryLoaderException(unicode(e))
-        
+    if cache:
+        d = cache.load(filename, st=st)
+    if d is None:
+        try:
+            with open(filename, 'rb') as f:
+                data = f.read()
+        except IOError as e:
+            raise DictionaryLoaderException(unicode(e))
+        if cache:
+            # The file may have been touched without changing.
+            d = cache.load(filename, data, st)
+        if d is None:
+            d = dict_type.load_dictionary(data)
+            if cache and background:
+                cache.store_in_background(filename, d, data, st)
+            elif cache:
+                cache.store(filename, d, data, st)
+
+    # Changes saved since the file was last written are in its journal.
+    DictionaryJournal(filename).replay(d)
+    return d
+
+def read_changes(d, filename):
+    """Compare d with its file and return the entries that differ.
+
+    Returns a list of (key, value) pairs where a value of None means the key
+    is no longer in the file. Keys with unsaved edits are left out. The file
+    is parsed in the calling thread and d is not modified, so this can run in
+    the background while d is in use.
+
+    """
+    dict_type = _dictionary_type(filename)
+    new = _parse_dictionary(filename, dict_type)._dict
+    # Copying is atomic so d may change while the copy is compared.
+    old = dict(d._dict)
+    changes = [(k, v) for k, v in new.iteritems() if old.get(k) != v]
+    changes.extend((k, None) for k in old if k not in new)
+    # Edits that haven't been saved yet are kept.
+    if isinstance(d.save, ThreadedSaver):
+        pending = d.save.pending_keys()
+        changes = [c for c in changes if c[0] not in pending]
+    return changes
+
+def apply_changes(d, changes):
+    """Apply changes read from d's file without saving them back to it."""
+    saver = d.save if isinstance(d.save, ThreadedSaver) else None
+    if saver:
+        saver.recording = False
+    try:
+        for key, value in changes:
+            if value is None:
+                if key in d._dict:
+                    del d[key]
+            else:
+                d[key] = value
+    finally:
+        if saver:
+            saver.recording = True
+
+def load_dictionary_state(filename):
+    """Load a dictionary and return its state for sending between processes.
+
+    Returns None for dictionaries that are not held in memory. Those are quick
+    to open and must be opened by the process that uses them.
+
+    """
+    d = load_dictionary(filename, background=False)
+    if not d.in_memory:
+        return None
+    return d.__getstate__()
+
+def restore_dictionary(filename, state):
+    """Rebuild a dictionary from the result of load_dictionary_state."""
+    dict_type = _dictionary_type(filename)
+    d = StenoDictionary.__new__(StenoDictionary)
+    d.__setstate__(state)
     d.save = ThreadedSaver(d, filename, dict_type.save_dictionary)
     return d
 
@@ -51,22 +166,224 @@ def save_dictionary(d, filename, saver):
 
     # Then move the new file to the final location.
     shutil.move(tmp, filename)
+
+def convert_dictionary(source, target):
+    """Write the entries of the dictionary file source to the file target.
+
+    The format of each file is chosen by its extension, so this imports
+    dictionaries into a format or exports them from it.
+
+    """
+    d = load_dictionary(source, background=False)
+    save_dictionary(d, target, _dictionary_type(target).save_dictionary)
     
+# Compact journals once they grow past this many bytes.
+JOURNAL_COMPACT_SIZE = 256 * 1024
+# Compact journals after this many seconds without saves.
+JOURNAL_COMPACT_DELAY = 60
+# Wait this many seconds for more edits before saving.
+SAVE_DELAY = 0.5
+
+class _SaveScheduler(object):
+    """A single background thread that does all dictionary writes.
+
+    Requests for the same action on the same saver are merged and run once no
+    new request for it has come in for the requested delay.
+    """
+    def __init__(self):
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, saver, action, delay):
+        """Run getattr(saver, action)() in delay seconds."""
+        with self._condition:
+            self._pending[(saver, action)] = time.time() + delay
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+
+    def cancel(self, saver, action):
+        with self._condition:
+            self._pending.pop((saver, action), None)
+
+    def flush(self):
+        """Run all pending saves now, in the calling thread."""
+        with self._condition:
+            pending = [k for k in self._pending if k[1] == 'save']
+            for k in pending:
+                del self._pending[k]
+        for saver, action in pending:
+            getattr(saver, action)()
+
+    def _next(self):
+        with self._condition:
+            while True:
+                if not self._pending:
+                    self._condition.wait()
+                    continue
+                key, due = min(self._pending.iteritems(), key=lambda i: i[1])
+                now = time.time()
+                if due <= now:
+                    del self._pending[key]
+                    return key
+                self._condition.wait(due - now)
+
+    def _run(self):
+        while True:
+            saver, action = self._next()
+            try:
+                getattr(saver, action)()
+            except Exception:
+                logging.getLogger(LOGGER_NAME).exception(
+                    'Saving %s failed', saver.filename)
+
+_scheduler = _SaveScheduler()
+
 class ThreadedSaver(object):
     """A callable that saves a dictionary in the background.
     
-    Also makes sure that there is only one active call at a time.
+    Saves are done by one background writer shared by all dictionaries, so
+    there is only one active write at a time. A burst of calls results in a
+    single save once the edits stop, and dictionaries that have not changed
+    since their last save are skipped.
+
+    Only the entries changed since the last save are written, by appending
+    them to the dictionary's journal. The journal is compacted into the
+    dictionary file when it gets too big, when there have been no saves for a
+    while and at shutdown through flush_all.
     """
     def __init__(self, d, filename, saver):
         self.d = d
         self.filename = filename
         self.saver = saver
         self.lock = threading.Lock()
+        self.journal = DictionaryJournal(filename)
+        self.change_count = 0
+        self.saved_change_count = 0
+        self._changes = {}
+        self._changes_lock = threading.Lock()
+        # Whether changes to d need to be saved.
+        self.recording = True
+        d.add_entry_listener(self._record_change)
+        _savers.add(self)
         
     def __call__(self):
-        t = threading.Thread(target=self.save)
-        t.start()
+        if self.change_count != self.saved_change_count:
+            _scheduler.schedule(self, 'save', SAVE_DELAY)
         
     def save(self):
         with self.lock:
-            save_dictionary(self.d, self.filename, self.saver)
+            count, changes = self._take_changes()
+            if not changes:
+                return
+            try:
+                self.journal.append(changes.iteritems())
+            except Exception:
+                self._restore_changes(changes)
+                raise
+            self.saved_change_count = count
+            if self.journal.size() >= JOURNAL_COMPACT_SIZE:
+                self._compact()
+            else:
+                _scheduler.schedule(self, 'compact', JOURNAL_COMPACT_DELAY)
+
+    def compact(self):
+        """Rewrite the dictionary file and drop the journal."""
+        with self.lock:
+            if self.journal.exists() or self._changes:
+                self._compact()
+
+    def _compact(self):
+        _scheduler.cancel(self, 'compact')
+        # Everything changed so far is included in the rewrite.
+        count, changes = self._take_changes()
+        try:
+            with _written_lock:
+                save_dictionary(self.d, self.filename, self.saver)
+                _written[os.path.abspath(self.filename)] = file_signature(
+                    self.filename)
+        except Exception:
+            # The changes are saved again by the next save or compaction.
+            self._restore_changes(changes)
+            raise
+        self.saved_change_count = count
+        self.journal.remove()
+
+    def close(self):
+        """Save the pending changes to the journal and stop saving d.
+
+        Called when d is replaced by a new copy of its file, so that the old
+        copy can't overwrite the file with stale contents later.
+
+        """
+        with self.lock:
+            _scheduler.cancel(self, 'save')
+            _scheduler.cancel(self, 'compact')
+            self.d.remove_entry_listener(self._record_change)
+            _savers.discard(self)
+            count, changes = self._take_changes()
+            self.journal.append(changes.iteritems())
+            self.saved_change_count = count
+
+    def _record_change(self, d, key, old_value, new_value):
+        if not self.recording or key is None:
+            return
+        with self._changes_lock:
+            self._changes[key] = new_value
+            self.change_count += 1
+
+    def pending_keys(self):
+        """The keys changed since the last save."""
+        with self._changes_lock:
+            return set(self._changes)
+
+    def _take_changes(self):
+        with self._changes_lock:
+            changes, self._changes = self._changes, {}
+            return self.change_count, changes
+
+    def _restore_changes(self, changes):
+        with self._changes_lock:
+            # Changes made since they were taken are newer.
+            for key, value in changes.iteritems():
+                self._changes.setdefault(key, value)
+
+# Savers are kept until they are closed so that edits are never dropped with
+# their dictionary before they are saved.
+_savers = set()
+
+# The signatures of the files rewritten by savers, so their own writes can be
+# told apart from changes made by other programs.
+_written = {}
+_written_lock = threading.Lock()
+
+def written_by_plover(filename):
+    """Whether filename has not changed since Plover last rewrote it."""
+    # Waits for a rewrite in progress to be recorded.
+    with _written_lock:
+        signature = _written.get(os.path.abspath(filename))
+    return signature is not None and signature == file_signature(filename)
+
+def close_dictionary(d):
+    """Stop saving d and close its file, it is no longer used."""
+    saver = getattr(d, 'save', None)
+    if isinstance(saver, ThreadedSaver):
+        saver.close()
+    # Dictionaries that read their files in place keep them open.
+    close = getattr(d, 'close', None)
+    if close:
+        close()
+
+def flush_all():
+    """Write all pending saves and compact all journals before exiting."""
+    _scheduler.flush()
+    for saver in list(_savers):
+        try:
+            saver.compact()
+        except Exception:
+            # The other dictionaries are still saved.
+            logging.getLogger(LOGGER_NAME).exception(
+                'Saving %s failed', saver.filename)
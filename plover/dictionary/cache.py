@@ -0,0 +1,135 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""On disk cache of loaded dictionaries.
+
+Parsing large dictionaries, especially RTF ones, is slow. The cache stores the
+normalized entries and derived indexes of each loaded dictionary in a compact
+binary file so the next start can skip parsing entirely. A cache file is valid
+while the dictionary file has the same modification time and size, or failing
+that, the same content hash.
+
+"""
+
+import hashlib
+import marshal
+import os
+import threading
+
+from plover.steno_dictionary import StenoDictionary
+
+# Bump this whenever the format of the cached state changes.
+CACHE_VERSION = 2
+CACHE_EXTENSION = '.cache'
+
+
+def content_hash(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+class DictionaryCache(object):
+    """Store and retrieve compiled dictionaries in a directory.
+
+    Cache problems are never fatal: if a cache file can't be read or written
+    the dictionary is simply parsed from its source.
+
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+
+    def cache_filename(self, filename):
+        name = hashlib.sha1(os.path.abspath(filename)).hexdigest()
+        return os.path.join(self.directory, name + CACHE_EXTENSION)
+
+    def load(self, filename, data=None, st=None):
+        """Return the cached dictionary for filename or None if it is stale.
+
+        When the file was touched without changing, the cache is updated with
+        its new modification time and size so the next load doesn't need its
+        contents.
+
+        Arguments:
+
+        filename -- The dictionary file.
+
+        data -- The contents of the dictionary file, if already read. Only
+        needed when the modification time or size have changed.
+
+        st -- The result of os.stat for the file, taken before data was read.
+
+        """
+        try:
+            if st is None:
+                st = os.stat(filename)
+            with open(self.cache_filename(filename), 'rb') as f:
+                header = marshal.load(f)
+                version, mtime, size, digest = header
+                if version != CACHE_VERSION:
+                    return None
+                touched = (mtime, size) != (st.st_mtime, st.st_size)
+                if touched:
+                    if data is None or content_hash(data) != digest:
+                        return None
+                dumped_state = f.read()
+            state = marshal.loads(dumped_state)
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return None
+        d = StenoDictionary.__new__(StenoDictionary)
+        d.__setstate__(state)
+        if touched:
+            self._write(filename, dumped_state, data, st, digest)
+        return d
+
+    def store(self, filename, d, data=None, st=None):
+        """Write the cache for dictionary d loaded from filename.
+
+        Arguments:
+
+        filename -- The dictionary file d was loaded from.
+
+        d -- The StenoDictionary.
+
+        data -- The contents of the dictionary file. It will be read if not
+        given.
+
+        st -- The result of os.stat for the file, taken before data was read,
+        so that a file changed since then is not cached as unchanged.
+
+        """
+        self._write(filename, marshal.dumps(d.__getstate__()), data, st)
+
+    def store_in_background(self, filename, d, data=None, st=None):
+        """Like store but only the snapshot of d is taken in this thread."""
+        state = marshal.dumps(d.__getstate__())
+        t = threading.Thread(target=self._write, 
+                             args=(filename, state, data, st))
+        t.daemon = True
+        t.start()
+        return t
+
+    def _write(self, filename, state, data, st, digest=None):
+        try:
+            if data is None:
+                st = os.stat(filename)
+                with open(filename, 'rb') as f:
+                    data = f.read()
+            elif st is None:
+                st = os.stat(filename)
+            if digest is None:
+                digest = content_hash(data)
+            header = (CACHE_VERSION, st.st_mtime, st.st_size, digest)
+            cache_filename = self.cache_filename(filename)
+            with self.lock:
+                if not os.path.isdir(self.directory):
+                    os.makedirs(self.directory)
+                tmp = cache_filename + '.tmp'
+                with open(tmp, 'wb') as f:
+                    marshal.dump(header, f)
+                    f.write(state)
+                if os.path.exists(cache_filename):
+                    os.remove(cache_filename)
+                os.rename(tmp, cache_filename)
+        except (IOError, OSError, ValueError):
+            pass
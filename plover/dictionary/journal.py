@@ -0,0 +1,97 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Append only journal of changes to a dictionary file.
+
+Rewriting a large dictionary file to save a single new entry is slow. Instead,
+changes are appended to a small journal file next to the dictionary and
+replayed on top of it when it is loaded. The journal is folded back into the
+dictionary file from time to time by rewriting it and removing the journal.
+
+Each line of the journal is a json list: ["set", strokes, translation] or
+["del", strokes], with the strokes joined by '/'.
+
+"""
+
+import os
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+JOURNAL_EXTENSION = '.journal'
+
+
+class DictionaryJournal(object):
+    """The journal for one dictionary file."""
+
+    def __init__(self, filename):
+        self.filename = filename + JOURNAL_EXTENSION
+
+    def exists(self):
+        return os.path.exists(self.filename)
+
+    def size(self):
+        """The size of the journal in bytes, 0 if there is none."""
+        try:
+            return os.path.getsize(self.filename)
+        except OSError:
+            return 0
+
+    def append(self, changes):
+        """Append changes to the journal.
+
+        Arguments:
+
+        changes -- An iterable of (key, value) pairs where a value of None
+        means the key was deleted.
+
+        """
+        lines = []
+        for key, value in changes:
+            strokes = '/'.join(key)
+            if value is None:
+                lines.append(json.dumps(['del', strokes]))
+            else:
+                lines.append(json.dumps(['set', strokes, value]))
+        if not lines:
+            return
+        with open(self.filename, 'ab') as f:
+            f.write('\n'.join(lines) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def replay(self, d):
+        """Apply the journaled changes to d and return how many there were.
+
+        Lines that can't be parsed, such as one cut short by a crash, are
+        skipped.
+
+        """
+        try:
+            with open(self.filename, 'rb') as f:
+                lines = f.readlines()
+        except IOError:
+            return 0
+        count = 0
+        for line in lines:
+            try:
+                change = json.loads(line)
+                action, key = change[0], tuple(change[1].split('/'))
+                if action == 'set':
+                    d[key] = change[2]
+                elif action == 'del':
+                    d.pop(key, None)
+                else:
+                    continue
+            except (ValueError, IndexError, TypeError, AttributeError):
+                continue
+            count += 1
+        return count
+
+    def remove(self):
+        try:
+            os.remove(self.filename)
+        except OSError:
+            pass
@@ -5,6 +5,9 @@
 
 """
 
+import itertools
+import operator
+
 from plover.steno_dictionary import StenoDictionary
 from plover.steno import normalize_steno
 from plover.exception import DictionaryLoaderException
@@ -19,7 +22,8 @@ def load_dictionary(data):
     """Load a json dictionary from a string."""
 
     def h(pairs):
-        return StenoDictionary((normalize_steno(x[0]), x[1]) for x in pairs)
+        return StenoDictionary.from_pairs((normalize_steno(x[0]), x[1]) 
+                                          for x in pairs)
 
     try:
         try:
@@ -29,7 +33,58 @@ def load_dictionary(data):
     except ValueError:
         raise DictionaryLoaderException('Dictionary is not valid json.')
         
-# TODO: test this
-def save_dictionary(d, fp):
-    d = dict(('/'.join(k), v) for k, v in d.iteritems())
-    json.dump(d, fp, sort_keys=True, indent=0, separators=(',', ': '))
+# The number of entries written at a time.
+SAVE_BATCH_SIZE = 1000
+
+def save_dictionary(d, fp, sort_keys=True):
+    """Save a dictionary as json.
+
+    The output is the same as json.dump with sort_keys=True, indent=0 and
+    separators=(',', ': '), but entries are written as they are formatted.
+
+    Arguments:
+
+    d -- The dictionary to save.
+
+    fp -- The file to write to.
+
+    sort_keys -- Whether to write the entries sorted by steno. If False they
+    are written in the dictionary's order, which is faster. Different keys
+    that join to the same steno are then all written, and loading the file
+    keeps the last of them.
+
+    """
+    encode = json.encoder.encode_basestring_ascii
+    # The entries are copied in one step since d may be edited by another
+    # thread while the file is written.
+    items = list(d.iteritems())
+    items = (('/'.join(k), v) for k, v in items)
+    if sort_keys:
+        # The sort is stable, so keys that join to the same steno end up next
+        # to each other in the dictionary's order.
+        items = _last_of_each_key(sorted(items, key=operator.itemgetter(0)))
+    lines = ('%s: %s' % (encode(k), encode(v) if isinstance(v, basestring)
+                                    else json.dumps(v))
+             for k, v in items)
+    separator = '{\n'
+    while True:
+        batch = list(itertools.islice(lines, SAVE_BATCH_SIZE))
+        if not batch:
+            break
+        fp.write(separator + ',\n'.join(batch))
+        separator = ',\n'
+    fp.write('{}' if separator == '{\n' else '\n}')
+
+def _last_of_each_key(items):
+    """Yield the last of each run of sorted pairs with the same key.
+
+    This is the pair that building a dict of them would keep.
+
+    """
+    previous = None
+    for item in items:
+        if previous is not None and item[0] != previous[0]:
+            yield previous
+        previous = item
+    if previous is not None:
+        yield previous
@@ -3,41 +3,140 @@
 
 """Centralized place for dictionary loading operation."""
 
+import multiprocessing
+import os
 import threading
 from plover.dictionary.base import load_dictionary
+from plover.dictionary.base import load_dictionary_state, restore_dictionary
+from plover.dictionary.base import close_dictionary, written_by_plover
 from plover.exception import DictionaryLoaderException
+from plover.interning import sharing, begin_sharing, end_sharing
 
 class DictionaryLoadingManager(object):
     def __init__(self):
         self.dictionaries = {}
+        self.processes = 0
+        self._pool = None
+
+    def set_processes(self, processes):
+        """Set the number of worker processes used to parse dictionaries.
+
+        Parsing holds the interpreter lock so loading threads run one at a
+        time. With worker processes, files are parsed in parallel and only
+        their compiled state is sent back. 0 means load in threads.
+
+        """
+        self.processes = processes
+
+    def _get_pool(self):
+        if not self.processes:
+            return None
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.processes)
+        return self._pool
+
+    def _close_pool(self):
+        # A pool is only used for the files started together. Its workers
+        # exit once they have parsed them, so no idle processes are kept and
+        # none are forked again from the pool's threads.
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
         
     def start_loading(self, filename):
-        if filename in self.dictionaries:
-            return self.dictionaries[filename]
-        op = DictionaryLoadingOperation(filename)
+        try:
+            return self._start_loading(filename)
+        finally:
+            self._close_pool()
+
+    def _start_loading(self, filename):
+        op = self.dictionaries.get(filename)
+        # Files changed since they were loaded are loaded again, unless the
+        # change was Plover saving the loaded dictionary.
+        if op and (op.mtime == _mtime(filename) or 
+                   written_by_plover(filename)):
+            return op
+        if op:
+            # The old copy's edits are saved first so the new one has them.
+            d, e = op.get()
+            if d is not None:
+                close_dictionary(d)
+        op = DictionaryLoadingOperation(filename, self._get_pool())
         self.dictionaries[filename] = op
         return op
         
     def load(self, filenames):
-        self.dictionaries = {f: self.start_loading(f) for f in filenames}
-        # Result must be in order given so can't just use values().
-        ops = [self.dictionaries[f] for f in filenames]
-        results = [op.get() for op in ops]
+        # Dictionaries loaded together share their translations.
+        with sharing():
+            self._set_files(filenames)
+            # Result must be in order given so can't just use values().
+            ops = [self.dictionaries[f] for f in filenames]
+            results = [op.get() for op in ops]
         dicts = []
         for d, e in results:
             if e:
                 raise e
             dicts.append(d)
         return dicts
+
+    def load_progressively(self, filenames, callback):
+        """Load dictionaries without waiting for them to finish.
+
+        callback(filename, dictionary, exception) is called from a background
+        thread as each dictionary finishes loading, in no particular order.
+
+        """
+        # Dictionaries loaded together share their translations until the
+        # last of them is passed to callback.
+        for filename in filenames:
+            begin_sharing()
+        self._set_files(filenames)
+        for filename in filenames:
+            op = self.dictionaries[filename]
+            t = threading.Thread(target=_notify, args=(op, callback))
+            t.daemon = True
+            t.start()
+
+    def _set_files(self, filenames):
+        old = self.dictionaries
+        try:
+            self.dictionaries = {f: self._start_loading(f) for f in filenames}
+        finally:
+            self._close_pool()
+        # Dictionaries that are no longer used stop being saved.
+        for filename, op in old.iteritems():
+            if filename not in self.dictionaries:
+                d, e = op.get()
+                if d is not None:
+                    close_dictionary(d)
         
         
+def _notify(op, callback):
+    try:
+        op.notify(callback)
+    finally:
+        end_sharing()
+
+def _mtime(filename):
+    try:
+        return os.path.getmtime(filename)
+    except OSError:
+        return None
+
 class DictionaryLoadingOperation(object):
-    def __init__(self, filename):
-        self.loading_thread = threading.Thread(target=self.load)
+    def __init__(self, filename, pool=None):
         self.filename = filename
+        self.mtime = _mtime(filename)
         self.exception = None
         self.dictionary = None
-        self.loading_thread.start()
+        self.loading_thread = None
+        self._result = None
+        self._lock = threading.Lock()
+        if pool is None:
+            self.loading_thread = threading.Thread(target=self.load)
+            self.loading_thread.start()
+        else:
+            self._result = pool.apply_async(load_dictionary_state, (filename,))
         
     def load(self):
         try:
@@ -45,9 +144,32 @@ class DictionaryLoadingOperation(object):
             self.dictionary.set_path(self.filename)
         except DictionaryLoaderException as e:
             self.exception = e
+
+    def _receive(self):
+        try:
+            state = self._result.get()
+        except DictionaryLoaderException as e:
+            self.exception = e
+            return
+        if state is None:
+            self.load()
+            return
+        self.dictionary = restore_dictionary(self.filename, state)
+        self.dictionary.set_path(self.filename)
         
     def get(self):
-        self.loading_thread.join()
+        if self.loading_thread:
+            self.loading_thread.join()
+        else:
+            with self._lock:
+                if self._result is not None:
+                    self._receive()
+                    self._result = None
         return self.dictionary, self.exception
 
+    def notify(self, callback):
+        """Wait for the dictionary and pass it to callback."""
+        d, e = self.get()
+        callback(self.filename, d, e)
+
 manager = DictionaryLoadingManager()
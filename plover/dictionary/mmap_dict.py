@@ -0,0 +1,263 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""A read only dictionary served from a memory mapped file.
+
+Very large dictionaries take a long time to load and a lot of memory as a python
+dict. This format is a compiled binary file that is looked up in place: the
+file is memory mapped and lookups probe on disk hash tables, so nothing is
+built in memory and several processes using the same file share its pages.
+
+File layout, all integers are little endian unsigned 32 bit:
+
+header -- The magic string, then the number of entries, the longest key, and
+the offset and slot count of the key table, the translation table and the
+prefix table, then the offset of the first entry record.
+
+records -- One record per entry: the length of the key, the length of the
+translation, then the key (strokes joined with '/') and the translation, both
+encoded as UTF-8.
+
+prefix records -- One record per proper prefix of a key: its length followed by
+the prefix, encoded like keys.
+
+tables -- Open addressing hash tables of record offsets, 0 for an empty slot,
+probed linearly from the CRC32 of the key, translation or prefix.
+
+"""
+
+import collections
+import mmap
+import struct
+import zlib
+
+from plover.steno_dictionary import StenoDictionary
+from plover.exception import DictionaryLoaderException
+
+MAGIC = 'PLVMMAP1'
+HEADER = struct.Struct('<8s9I')
+UINT32 = struct.Struct('<I')
+RECORD = struct.Struct('<II')
+
+
+def _hash(s):
+    return zlib.crc32(s) & 0xffffffff
+
+def _encode_key(key):
+    key = '/'.join(key)
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+    return key
+
+def _encode_value(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+def _table_size(n):
+    size = 8
+    while size < n * 2:
+        size *= 2
+    return size
+
+
+class _MappedEntries(collections.Mapping):
+    """The entries of a memory mapped dictionary as a read only mapping."""
+
+    def __init__(self, data):
+        self._data = data
+        try:
+            header = HEADER.unpack_from(data, 0)
+        except struct.error:
+            raise DictionaryLoaderException('Dictionary file is truncated.')
+        if header[0] != MAGIC:
+            raise DictionaryLoaderException('Not a compiled dictionary.')
+        (self._count, self.longest_key,
+         self._key_table, self._key_slots,
+         self._value_table, self._value_slots,
+         self._prefix_table, self._prefix_slots,
+         self._records) = header[1:]
+
+    def _probe(self, table, slots, h):
+        data = self._data
+        mask = slots - 1
+        slot = h & mask
+        while True:
+            offset = UINT32.unpack_from(data, table + 4 * slot)[0]
+            if not offset:
+                return
+            yield offset
+            slot = (slot + 1) & mask
+
+    def _record(self, offset):
+        key_length, value_length = RECORD.unpack_from(self._data, offset)
+        start = offset + RECORD.size
+        middle = start + key_length
+        return start, middle, middle + value_length
+
+    def _find(self, encoded_key):
+        data = self._data
+        for offset in self._probe(self._key_table, self._key_slots,
+                                  _hash(encoded_key)):
+            start, middle, end = self._record(offset)
+            if data[start:middle] == encoded_key:
+                return data[middle:end].decode('utf-8')
+        return None
+
+    def __getitem__(self, key):
+        value = self._find(_encode_key(key))
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        value = self._find(_encode_key(key))
+        if value is None:
+            return default
+        return value
+
+    def __contains__(self, key):
+        return self._find(_encode_key(key)) is not None
+
+    def __len__(self):
+        return self._count
+
+    def iteritems(self):
+        data = self._data
+        offset = self._records
+        for i in xrange(self._count):
+            start, middle, end = self._record(offset)
+            yield (tuple(data[start:middle].split('/')),
+                   data[middle:end].decode('utf-8'))
+            offset = end
+
+    def __iter__(self):
+        return (k for k, v in self.iteritems())
+
+    iterkeys = __iter__
+
+    def itervalues(self):
+        return (v for k, v in self.iteritems())
+
+    def keys_for_value(self, value):
+        data = self._data
+        encoded_value = _encode_value(value)
+        keys = []
+        for offset in self._probe(self._value_table, self._value_slots,
+                                  _hash(encoded_value)):
+            start, middle, end = self._record(offset)
+            if data[middle:end] == encoded_value:
+                keys.append(tuple(data[start:middle].split('/')))
+        return keys
+
+    def has_prefix(self, key):
+        data = self._data
+        encoded_key = _encode_key(key)
+        for offset in self._probe(self._prefix_table, self._prefix_slots,
+                                  _hash(encoded_key)):
+            length = UINT32.unpack_from(data, offset)[0]
+            start = offset + UINT32.size
+            if data[start:start + length] == encoded_key:
+                return True
+        return False
+
+
+class MappedStenoDictionary(StenoDictionary):
+    """A read only StenoDictionary that looks entries up in a mapped file."""
+
+    in_memory = False
+    readonly = True
+
+    def __init__(self, f):
+        StenoDictionary.__init__(self)
+        try:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, EnvironmentError) as e:
+            raise DictionaryLoaderException(unicode(e))
+        self._dict = _MappedEntries(self._mmap)
+        self._reverse_enabled = False
+        self._longest_key_length = self._dict.longest_key
+        self.save = _noop
+
+    def __setitem__(self, key, value):
+        raise TypeError('%s is read only' % self.get_path())
+
+    def __delitem__(self, key):
+        raise TypeError('%s is read only' % self.get_path())
+
+    def __getstate__(self):
+        raise TypeError('Memory mapped dictionaries are not serializable.')
+
+    def has_prefix(self, key):
+        return self._dict.has_prefix(key)
+
+    def reverse_lookup(self, value):
+        return self._dict.keys_for_value(value)
+
+    def close(self):
+        self._mmap.close()
+
+def _noop():
+    pass
+
+
+def open_dictionary(filename):
+    """Open a compiled dictionary without reading it into memory."""
+    try:
+        with open(filename, 'rb') as f:
+            return MappedStenoDictionary(f)
+    except IOError as e:
+        raise DictionaryLoaderException(unicode(e))
+
+def load_dictionary(data):
+    """Load a compiled dictionary from a string."""
+    return StenoDictionary.from_pairs(_MappedEntries(data).iteritems())
+
+def save_dictionary(d, fp):
+    """Compile the entries of d into the memory mapped format."""
+    records = []
+    key_hashes = []
+    value_hashes = []
+    prefixes = set()
+    longest_key = 0
+    offset = HEADER.size
+    # The entries are copied in one step since d may be edited by another
+    # thread while it is compiled.
+    for key, value in list(d.iteritems()):
+        encoded_key = _encode_key(key)
+        encoded_value = _encode_value(value)
+        records.append(RECORD.pack(len(encoded_key), len(encoded_value)))
+        records.append(encoded_key)
+        records.append(encoded_value)
+        key_hashes.append((_hash(encoded_key), offset))
+        value_hashes.append((_hash(encoded_value), offset))
+        offset += RECORD.size + len(encoded_key) + len(encoded_value)
+        longest_key = max(longest_key, len(key))
+        for i in xrange(1, len(key)):
+            prefixes.add(_encode_key(key[:i]))
+    prefix_hashes = []
+    for prefix in prefixes:
+        records.append(UINT32.pack(len(prefix)))
+        records.append(prefix)
+        prefix_hashes.append((_hash(prefix), offset))
+        offset += UINT32.size + len(prefix)
+
+    tables = []
+    table_positions = []
+    for hashes in (key_hashes, value_hashes, prefix_hashes):
+        slots = _table_size(len(hashes))
+        table = [0] * slots
+        mask = slots - 1
+        for h, record_offset in hashes:
+            slot = h & mask
+            while table[slot]:
+                slot = (slot + 1) & mask
+            table[slot] = record_offset
+        table_positions.extend((offset, slots))
+        tables.append(struct.pack('<%dI' % slots, *table))
+        offset += 4 * slots
+
+    fp.write(HEADER.pack(MAGIC, len(key_hashes), longest_key,
+                         *(table_positions + [HEADER.size])))
+    fp.write(''.join(records))
+    fp.write(''.join(tables))
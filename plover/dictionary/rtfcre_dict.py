@@ -14,18 +14,14 @@ http://www.legalxml.org/workgroups/substantive/transcripts/cre-spec.htm
 """
 
 import inspect
+import marshal
+import multiprocessing
 import re
 from plover.steno import normalize_steno
 from plover.steno_dictionary import StenoDictionary
 # TODO: Move dictionary format somewhere more caninical than formatting.
 from plover.formatting import META_RE
 
-# A regular expression to capture an individual entry in the dictionary.
-DICT_ENTRY_PATTERN = re.compile(r'(?s)(?<!\\){\\\*\\cxs (?P<steno>[^}]+)}' + 
-                                r'(?P<translation>.*?)(?:(?<!\\)(?:\r\n|\n))*?'+
-                                r'(?=(?:(?<!\\){\\\*\\cxs [^}]+})|' +
-                                r'(?:(?:(?<!\\)(?:\r\n|\n)\s*)*}\s*\Z))')
-
 class TranslationConverter(object):
     """Convert an RTF/CRE translation into plover's internal format."""
     
@@ -37,12 +33,22 @@ class TranslationConverter(object):
         
         handler_funcs = inspect.getmembers(self, inspect.ismethod)
         handler_funcs.sort(key=linenumber)
-        handlers = [self._make_re_handler(f.__doc__, f)
+        handlers = [(name[len('_re_handle_'):], 
+                     self._make_re_handler(f.__doc__, f))
                     for name, f in handler_funcs 
                     if name.startswith('_re_handle_')]
-        handlers.append(self._match_nested_command_group)
+        handlers.append(('nested_command_group', 
+                         self._match_nested_command_group))
+        self._handlers = handlers
+        # The handlers to try for each character, in order.
+        self._dispatch = {}
         def handler(s, pos):
-            for handler in handlers:
+            c = s[pos]
+            try:
+                candidates = self._dispatch[c]
+            except KeyError:
+                candidates = self._dispatch[c] = self._handlers_for(c)
+            for handler in candidates:
                 result = handler(s, pos)
                 if result:
                     return result
@@ -55,6 +61,35 @@ class TranslationConverter(object):
         # one where commands can be inserted (True) or not (False).
         self._whitespace = True
     
+    # The characters that a match of each handler can start with. The others
+    # can start with any character that is not special in RTF.
+    _HANDLER_STARTS = {
+        'escapedchar': '\\',
+        'hardspace': '\\',
+        'dash': '\\',
+        'escaped_newline': '\\',
+        'infix': '\\',
+        'suffix': '\\',
+        'commands': '\\',
+        'simple_command_group': '{',
+        'eclipse_command': '{',
+        'nested_command_group': '{',
+        'punctuation': '.?!:;,',
+    }
+    _SPECIAL_CHARS = '{}\\\r\n'
+
+    def _handlers_for(self, c):
+        """The handlers that can match text starting with c."""
+        handlers = []
+        for name, handler in self._handlers:
+            starts = self._HANDLER_STARTS.get(name)
+            if starts is None:
+                if c not in self._SPECIAL_CHARS:
+                    handlers.append(handler)
+            elif c in starts:
+                handlers.append(handler)
+        return handlers
+
     def _make_re_handler(self, pattern, f):
         pattern = re.compile(pattern)
         def handler(s, pos):
@@ -282,55 +317,308 @@ def load_stylesheet(s):
     """Returns a dictionary mapping a number to a style name."""
     return dict((int(k), v) for k, v in STYLESHEET_RE.findall(s))
 
-def load_dictionary(s):
-    """Load an RTF/CRE dictionary."""
-    styles = load_stylesheet(s)
-    d = {}
+# The start of an entry: the steno follows, up to the closing brace.
+ENTRY_START = '{\\*\\cxs '
+# How much of a dictionary the parser looks at at a time.
+CHUNK_SIZE = 64 * 1024
+
+def _find_entry(buf, pos):
+    """Find the next entry that starts at or after pos.
+
+    Returns ((start, steno, translation start), pos) where the first item is
+    None if buf ends before an entry is found, and pos is where to search
+    again once more text has been added to buf.
+
+    """
+    while True:
+        start = buf.find(ENTRY_START, pos)
+        if start == -1:
+            return None, max(pos, len(buf) - len(ENTRY_START) + 1)
+        if start and buf[start - 1] == '\\':
+            pos = start + 1
+            continue
+        steno_start = start + len(ENTRY_START)
+        steno_end = buf.find('}', steno_start)
+        if steno_end == -1:
+            return None, start
+        if steno_end == steno_start:
+            pos = start + 1
+            continue
+        return (start, buf[steno_start:steno_end], steno_end + 1), start
+
+def _is_newline(buf, i):
+    """Whether an unescaped newline starts at i."""
+    if i and buf[i - 1] == '\\':
+        return False
+    return buf[i] == '\n' or buf.startswith('\r\n', i)
+
+def _strip_newlines(buf, start, end):
+    """The translation in buf[start:end] without its trailing newlines."""
+    while end > start and buf[end - 1] == '\n':
+        if (end - 1 > start and buf[end - 2] == '\r' and 
+            _is_newline(buf, end - 2)):
+            end -= 2
+        elif _is_newline(buf, end - 1):
+            end -= 1
+        else:
+            break
+    return buf[start:end]
+
+def _last_translation(buf, start):
+    """The translation of the last entry, which runs to the closing brace.
+
+    Returns None if the file isn't closed properly.
+
+    """
+    end = len(buf.rstrip())
+    if end <= start or buf[end - 1] != '}':
+        return None
+    end -= 1
+    whitespace = len(buf[start:end].rstrip()) + start
+    for i in xrange(whitespace, end):
+        if _is_newline(buf, i):
+            return buf[start:i]
+    return buf[start:end]
+
+def _iter_entries(chunks):
+    """Yield the styles and then the (steno, translation) pairs of a file.
+
+    The file is given as an iterable of strings and is parsed in one pass. Only
+    the entry being read is kept in memory.
+
+    """
+    buf = ''
+    pos = 0
+    entry = None
+    for chunk in chunks:
+        if entry is None:
+            buf += chunk
+        else:
+            # Drop the parsed entries but keep the character before the
+            # current translation to tell if what follows it is escaped.
+            cut = entry[1] - 1
+            buf = buf[cut:] + chunk
+            pos -= cut
+            entry = entry[0], entry[1] - cut
+        while True:
+            found, pos = _find_entry(buf, pos)
+            if found is None:
+                break
+            start, steno, translation_start = found
+            if entry is None:
+                # The stylesheet is in the header, before the first entry.
+                yield load_stylesheet(buf[:start])
+            else:
+                yield entry[0], _strip_newlines(buf, entry[1], start)
+            pos = translation_start
+            entry = steno, pos
+    if entry is None:
+        yield load_stylesheet(buf)
+        return
+    translation = _last_translation(buf, entry[1])
+    if translation is not None:
+        yield entry[0], translation
+
+# Files at least this big are converted by several processes.
+PARALLEL_MIN_SIZE = 2 * 1024 * 1024
+# The size of the pieces of a file sent to each process.
+PARALLEL_CHUNK_SIZE = 512 * 1024
+# The number of processes used for big files. None means one per core and 0
+# or 1 converts in the calling process. Pools are forked from the calling
+# thread, which is unsafe in threaded programs on some platforms, so files are
+# converted in the calling process unless configured otherwise.
+processes = 0
+
+def _iter_converted(styles, entries):
+    """Convert (steno, translation) pairs, leaving out those that fail."""
     converter = TranslationConverter(styles)
-    for m in DICT_ENTRY_PATTERN.finditer(s):
-        steno = normalize_steno(m.group('steno'))
-        translation = m.group('translation')
-        converted = converter(translation)
+    # Many entries share translations so each is converted once.
+    converted_translations = {}
+    for steno, translation in entries:
+        try:
+            converted = converted_translations[translation]
+        except KeyError:
+            converted = converter(translation)
+            converted_translations[translation] = converted
         if converted is not None:
-            d[steno] = converted
-    return StenoDictionary(d)
+            yield normalize_steno(steno), converted
+
+def _split_entries(s, start, size):
+    """Split s into pieces of about size that start with an entry.
+
+    Yields (piece, last) pairs, where last is only True for the final piece.
+
+    """
+    while True:
+        found, pos = _find_entry(s, start + size)
+        if found is None:
+            yield s[start:], True
+            return
+        end = found[0]
+        yield s[start:end], False
+        start = end
+
+def _convert_piece(args):
+    """Parse and convert a piece of a file in a worker process."""
+    styles, piece, last = args
+    if not last:
+        # Follow the piece with the start of an entry, as in the file, so the
+        # newlines after its last translation are removed.
+        piece += ENTRY_START + 'S}'
+    entries = _iter_entries([piece])
+    next(entries)
+    # Much faster to send back than a pickle.
+    return marshal.dumps(list(_iter_converted(styles, entries)))
+
+def _convert_in_parallel(s, n):
+    """Convert the entries of s in n processes and yield them in file order."""
+    found, pos = _find_entry(s, 0)
+    if found is None:
+        return
+    start = found[0]
+    styles = load_stylesheet(s[:start])
+    pieces = ((styles, piece, last) for piece, last in 
+              _split_entries(s, start, PARALLEL_CHUNK_SIZE))
+    pool = multiprocessing.Pool(n)
+    try:
+        for results in pool.imap(_convert_piece, pieces):
+            for result in marshal.loads(results):
+                yield result
+    finally:
+        pool.terminate()
+
+def load_dictionary(s):
+    """Load an RTF/CRE dictionary."""
+    n = processes
+    if n is None:
+        n = multiprocessing.cpu_count()
+    # Processes that are themselves workers in a pool can't start another.
+    if (n > 1 and len(s) >= PARALLEL_MIN_SIZE and 
+        not multiprocessing.current_process().daemon):
+        converted = _convert_in_parallel(s, n)
+    else:
+        chunks = (s[i:i + CHUNK_SIZE] for i in xrange(0, len(s), CHUNK_SIZE))
+        entries = _iter_entries(chunks)
+        converted = _iter_converted(next(entries), entries)
+    # Later entries for the same steno replace earlier ones.
+    return StenoDictionary.from_pairs(converted)
 
 
 HEADER = ("{\\rtf1\\ansi{\\*\\cxrev100}\\cxdict{\\*\\cxsystem Plover}" +
           "{\\stylesheet{\\s0 Normal;}}\r\n")
 
-def format_translation(t):
-    t = ' '.join([x.strip() for x in META_RE.findall(t) if x.strip()])
-    
-    t = re.sub(r'{\.}', '{\\cxp. }', t)
-    t = re.sub(r'{!}', '{\\cxp! }', t)
-    t = re.sub(r'{\?}', '{\\cxp? }', t)
-    t = re.sub(r'{\,}', '{\\cxp, }', t)
-    t = re.sub(r'{:}', '{\\cxp: }', t)
-    t = re.sub(r'{;}', '{\\cxp; }', t)
-    t = re.sub(r'{\^}', '\\cxds ', t)
-    t = re.sub(r'{\^([^^}]*)}', '\\cxds \\1', t)
-    t = re.sub(r'{([^^}]*)\^}', '\\1\\cxds ', t)
-    t = re.sub(r'{\^([^^}]*)\^}', '\\cxds \\1\\cxds ', t)
-    t = re.sub(r'{-\|}', '\\cxfc ', t)
-    t = re.sub(r'{>}', '\\cxfls ', t)
-    t = re.sub(r'{ }', ' ', t)
-    t = re.sub(r'{&([^}]+)}', '{\\cxfing \\1}', t)
-    t = re.sub(r'{#([^}]+)}', '\\{#\\1\\}', t)
-    t = re.sub(r'{PLOVER:([a-zA-Z]+)}', '\\{PLOVER:\\1\\}', t)
-    t = re.sub(r'\\"', '"', t)
-    
+# The conversions from Plover's meta syntax to RTF/CRE, applied in order.
+META_SUBSTITUTIONS = [(re.compile(pattern), replacement) 
+                      for pattern, replacement in (
+    (r'{\.}', '{\\cxp. }'),
+    (r'{!}', '{\\cxp! }'),
+    (r'{\?}', '{\\cxp? }'),
+    (r'{\,}', '{\\cxp, }'),
+    (r'{:}', '{\\cxp: }'),
+    (r'{;}', '{\\cxp; }'),
+    (r'{\^}', '\\cxds '),
+    (r'{\^([^^}]*)}', '\\cxds \\1'),
+    (r'{([^^}]*)\^}', '\\1\\cxds '),
+    (r'{\^([^^}]*)\^}', '\\cxds \\1\\cxds '),
+    (r'{-\|}', '\\cxfc '),
+    (r'{>}', '\\cxfls '),
+    (r'{ }', ' '),
+    (r'{&([^}]+)}', '{\\cxfing \\1}'),
+    (r'{#([^}]+)}', '\\{#\\1\\}'),
+    (r'{PLOVER:([a-zA-Z]+)}', '\\{PLOVER:\\1\\}'),
+    (r'\\"', '"'),
+)]
+
+# Metas that convert to a fixed string.
+META_CONVERSIONS = {
+    '{.}': '{\\cxp. }',
+    '{!}': '{\\cxp! }',
+    '{?}': '{\\cxp? }',
+    '{,}': '{\\cxp, }',
+    '{:}': '{\\cxp: }',
+    '{;}': '{\\cxp; }',
+    '{^}': '\\cxds ',
+    '{-|}': '\\cxfc ',
+    '{>}': '\\cxfls ',
+    '{ }': ' ',
+}
+
+# The shapes of common metas, with plain text that no other conversion applies
+# to, and their conversions.
+META_PATTERNS = [(re.compile(pattern + r'\Z'), replacement) 
+                 for pattern, replacement in (
+    (r'{\^([^^{}\\"]+)}', '\\cxds %s'),
+    (r'{([^^{}\\"]+)\^}', '%s\\cxds '),
+    (r'{\^([^^{}\\"]*)\^}', '\\cxds %s\\cxds '),
+    (r'{&([^^{}\\"]+)}', '{\\cxfing %s}'),
+    (r'{#([^^{}\\"]+)}', '\\{#%s\\}'),
+    (r'{PLOVER:([a-zA-Z]+)}', '\\{PLOVER:%s\\}'),
+)]
+
+def _substitute(t):
+    for pattern, replacement in META_SUBSTITUTIONS:
+        t = pattern.sub(replacement, t)
     return t
+
+def _format_token(token):
+    """Convert a single piece of text or meta."""
+    if token[0] != '{':
+        return token.replace('\\"', '"')
+    try:
+        return META_CONVERSIONS[token]
+    except KeyError:
+        pass
+    for pattern, replacement in META_PATTERNS:
+        m = pattern.match(token)
+        if m:
+            return replacement % m.group(1)
+    return _substitute(token)
+
+def format_translation(t, cache=None):
+    """Convert a translation to RTF/CRE.
+
+    Arguments:
+
+    t -- The translation in Plover's format.
+
+    cache -- A dict to keep converted pieces of translations in to reuse.
+
+    """
+    tokens = [x.strip() for x in META_RE.findall(t)]
+    tokens = [x for x in tokens if x]
+    # Conversions can only span pieces when there are escaped braces.
+    for token in tokens:
+        inner = token[1:-1] if token[0] == '{' else token
+        if '{' in inner or '}' in inner:
+            return _substitute(' '.join(tokens))
+    if cache is None:
+        return ' '.join([_format_token(x) for x in tokens])
+    formatted = []
+    for token in tokens:
+        try:
+            formatted.append(cache[token])
+        except KeyError:
+            converted = cache[token] = _format_token(token)
+            formatted.append(converted)
+    return ' '.join(formatted)
     
 
-# TODO: test this
+# The number of entries written at a time.
+SAVE_BATCH_SIZE = 1000
+
 def save_dictionary(d, fp):
     fp.write(HEADER)
 
-    for s, t in d.items():
-        s = '/'.join(s)
-        t = format_translation(t)
-        entry = "{\\*\\cxs %s}%s\r\n" % (s, t)
-        fp.write(entry)
-
-    fp.write("}\r\n")
+    # The entries are copied in one step since d may be edited by another
+    # thread while the file is written.
+    items = list(d.iteritems())
+    cache = {}
+    batch = []
+    for s, t in items:
+        batch.append("{\\*\\cxs %s}%s\r\n" % 
+                     ('/'.join(s), format_translation(t, cache)))
+        if len(batch) == SAVE_BATCH_SIZE:
+            fp.write(''.join(batch))
+            batch = []
+    batch.append("}\r\n")
+    fp.write(''.join(batch))
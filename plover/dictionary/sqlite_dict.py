@@ -0,0 +1,258 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""A dictionary stored in an SQLite database.
+
+Entries are looked up, added and removed in the database file, so a dictionary
+does not need to be held in memory and each edit is saved as a transaction of
+its own instead of a rewrite of the whole file. Entries are kept in one table
+with an index on the outline, which is the strokes joined with '/', an index on
+the translation for reverse lookups and an index on the number of strokes for
+the longest key.
+
+Dictionaries in other formats are imported and exported with
+plover.dictionary.base.convert_dictionary.
+
+"""
+
+import collections
+import os
+import sqlite3
+import tempfile
+import threading
+
+from plover.steno_dictionary import StenoDictionary
+from plover.exception import DictionaryLoaderException
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    outline TEXT PRIMARY KEY,
+    translation TEXT NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_translation ON entries (translation);
+CREATE INDEX IF NOT EXISTS entries_length ON entries (length);
+'''
+
+# Outlines that start with a prefix and '/' sort between these two.
+_STROKE_DELIMITER = u'/'
+_AFTER_STROKE_DELIMITER = unichr(ord(_STROKE_DELIMITER) + 1)
+
+
+def _encode_key(key):
+    key = _STROKE_DELIMITER.join(key)
+    if isinstance(key, str):
+        key = key.decode('utf-8')
+    return key
+
+def _decode_key(outline):
+    return tuple(outline.split(_STROKE_DELIMITER))
+
+def _encode_value(value):
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    return value
+
+
+class _SQLiteEntries(collections.MutableMapping):
+    """The entries of a dictionary database as a mapping.
+
+    The connection is shared between threads and used under a lock.
+
+    """
+
+    def __init__(self, filename):
+        self._lock = threading.Lock()
+        try:
+            self._db = sqlite3.connect(filename, check_same_thread=False)
+            with self._db:
+                self._db.executescript(SCHEMA)
+        except sqlite3.Error as e:
+            raise DictionaryLoaderException(unicode(e))
+
+    def _query(self, sql, args=()):
+        with self._lock:
+            return self._db.execute(sql, args).fetchall()
+
+    def _find(self, outline):
+        rows = self._query('SELECT translation FROM entries WHERE outline = ?',
+                           (outline,))
+        return rows[0][0] if rows else None
+
+    def __getitem__(self, key):
+        value = self._find(_encode_key(key))
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        value = self._find(_encode_key(key))
+        if value is None:
+            return default
+        return value
+
+    def __contains__(self, key):
+        return self._find(_encode_key(key)) is not None
+
+    def replace(self, key, value):
+        """Set key to value and return the old value or None."""
+        outline = _encode_key(key)
+        with self._lock, self._db:
+            rows = self._db.execute(
+                'SELECT translation FROM entries WHERE outline = ?',
+                (outline,)).fetchall()
+            self._db.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?)',
+                (outline, _encode_value(value), len(key)))
+        return rows[0][0] if rows else None
+
+    def remove(self, key):
+        """Remove key and return its value."""
+        outline = _encode_key(key)
+        with self._lock, self._db:
+            rows = self._db.execute(
+                'SELECT translation FROM entries WHERE outline = ?',
+                (outline,)).fetchall()
+            if not rows:
+                raise KeyError(key)
+            self._db.execute('DELETE FROM entries WHERE outline = ?',
+                             (outline,))
+        return rows[0][0]
+
+    def __setitem__(self, key, value):
+        self.replace(key, value)
+
+    def __delitem__(self, key):
+        self.remove(key)
+
+    def update_all(self, items):
+        """Set many entries in a single transaction."""
+        rows = ((_encode_key(k), _encode_value(v), len(k)) for k, v in items)
+        with self._lock, self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?)', rows)
+
+    def __len__(self):
+        return self._query('SELECT COUNT(*) FROM entries')[0][0]
+
+    def iteritems(self):
+        rows = self._query('SELECT outline, translation FROM entries')
+        return ((_decode_key(outline), value) for outline, value in rows)
+
+    def __iter__(self):
+        rows = self._query('SELECT outline FROM entries')
+        return (_decode_key(row[0]) for row in rows)
+
+    iterkeys = __iter__
+
+    def itervalues(self):
+        rows = self._query('SELECT translation FROM entries')
+        return (row[0] for row in rows)
+
+    def keys_for_value(self, value):
+        rows = self._query('SELECT outline FROM entries WHERE translation = ?',
+                           (_encode_value(value),))
+        return [_decode_key(row[0]) for row in rows]
+
+    def has_prefix(self, key):
+        outline = _encode_key(key)
+        rows = self._query(
+            'SELECT 1 FROM entries WHERE outline > ? AND outline < ? LIMIT 1',
+            (outline + _STROKE_DELIMITER, outline + _AFTER_STROKE_DELIMITER))
+        return bool(rows)
+
+    def longest_key(self):
+        return self._query('SELECT MAX(length) FROM entries')[0][0] or 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class SQLiteStenoDictionary(StenoDictionary):
+    """A StenoDictionary that reads and writes entries in a database file.
+
+    Edits are written to the file as they are made so saving does nothing.
+
+    """
+
+    in_memory = False
+
+    def __init__(self, filename):
+        StenoDictionary.__init__(self)
+        self._dict = _SQLiteEntries(filename)
+        self._reverse_enabled = False
+        self._longest_key_length = self._dict.longest_key()
+        self.save = _noop
+
+    def __setitem__(self, key, value):
+        old_value = self._dict.replace(key, value)
+        self.generation += 1
+        self._longest_key = max(self._longest_key, len(key))
+        self._notify_entry_listeners(key, old_value, value)
+
+    def __delitem__(self, key):
+        value = self._dict.remove(key)
+        self.generation += 1
+        if len(key) == self._longest_key:
+            self._longest_key = self._dict.longest_key()
+        self._notify_entry_listeners(key, value, None)
+
+    def __getstate__(self):
+        raise TypeError('SQLite dictionaries are not serializable.')
+
+    def has_prefix(self, key):
+        return self._dict.has_prefix(key)
+
+    def reverse_lookup(self, value):
+        return self._dict.keys_for_value(value)
+
+    def refresh(self):
+        """Pick up changes made to the file by other programs."""
+        self.generation += 1
+        self._longest_key = self._dict.longest_key()
+        self._notify_entry_listeners(None, None, None)
+
+    def close(self):
+        self._dict.close()
+
+def _noop():
+    pass
+
+
+def open_dictionary(filename):
+    """Open a dictionary database without reading it into memory."""
+    if not os.path.isfile(filename):
+        raise DictionaryLoaderException('No such file: %s' % filename)
+    return SQLiteStenoDictionary(filename)
+
+def load_dictionary(data):
+    """Load a dictionary database from a string."""
+    fd, filename = tempfile.mkstemp(suffix='.sqlite')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        entries = _SQLiteEntries(filename)
+        try:
+            return StenoDictionary.from_pairs(entries.iteritems())
+        finally:
+            entries.close()
+    finally:
+        os.remove(filename)
+
+def save_dictionary(d, fp):
+    """Write the entries of d as a dictionary database."""
+    fd, filename = tempfile.mkstemp(suffix='.sqlite')
+    try:
+        os.close(fd)
+        entries = _SQLiteEntries(filename)
+        try:
+            # The entries are copied in one step since d may be edited by
+            # another thread while they are inserted.
+            entries.update_all(list(d.iteritems()))
+        finally:
+            entries.close()
+        with open(filename, 'rb') as f:
+            fp.write(f.read())
+    finally:
+        os.remove(filename)
@@ -0,0 +1,83 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Tests for cache.py."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from plover.dictionary.cache import DictionaryCache
+from plover.steno_dictionary import StenoDictionary
+
+
+class DictionaryCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = DictionaryCache(os.path.join(self.tmpdir, 'cache'))
+        self.filename = os.path.join(self.tmpdir, 'dict.json')
+        self.write('{"S": "a", "T/P": "b"}')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, data, mtime=None):
+        with open(self.filename, 'wb') as f:
+            f.write(data)
+        if mtime is not None:
+            os.utime(self.filename, (mtime, mtime))
+
+    def test_round_trip(self):
+        self.assertIsNone(self.cache.load(self.filename))
+        d = StenoDictionary({('S',): u'a', ('T', 'P'): 'b'})
+        self.cache.store(self.filename, d)
+        loaded = self.cache.load(self.filename)
+        self.assertEqual(loaded._dict, d._dict)
+        self.assertEqual(loaded.longest_key, 2)
+        self.assertTrue(loaded.has_prefix(('T',)))
+        # The loaded dictionary keeps its indexes up to date.
+        del loaded[('T', 'P')]
+        self.assertEqual(loaded.longest_key, 1)
+        self.assertFalse(loaded.has_prefix(('T',)))
+
+    def test_stale(self):
+        self.write('{"S": "a"}', mtime=1000)
+        d = StenoDictionary({('S',): 'a'})
+        self.cache.store(self.filename, d)
+        self.assertIsNotNone(self.cache.load(self.filename))
+        # Touched but unchanged files are valid given their contents.
+        self.write('{"S": "a"}', mtime=2000)
+        self.assertIsNone(self.cache.load(self.filename))
+        self.assertIsNotNone(self.cache.load(self.filename, '{"S": "a"}'))
+        # After which the new time is remembered.
+        self.assertIsNotNone(self.cache.load(self.filename))
+        # Changed files are not.
+        self.write('{"S": "bc"}', mtime=1000)
+        self.assertIsNone(self.cache.load(self.filename, '{"S": "bc"}'))
+
+    def test_store_with_earlier_stat(self):
+        self.write('{"S": "a"}', mtime=1000)
+        st = os.stat(self.filename)
+        # The file changes after it was read for d.
+        self.write('{"S": "bc"}', mtime=2000)
+        d = StenoDictionary({('S',): 'a'})
+        self.cache.store(self.filename, d, '{"S": "a"}', st)
+        self.assertIsNone(self.cache.load(self.filename))
+        self.assertIsNone(self.cache.load(self.filename, '{"S": "bc"}'))
+
+    def test_background_store(self):
+        d = StenoDictionary({('S',): 'a'})
+        self.cache.store_in_background(self.filename, d).join()
+        self.assertEqual(self.cache.load(self.filename)._dict, {('S',): 'a'})
+
+    def test_bad_cache_file(self):
+        d = StenoDictionary({('S',): 'a'})
+        self.cache.store(self.filename, d)
+        with open(self.cache.cache_filename(self.filename), 'wb') as f:
+            f.write('garbage')
+        self.assertIsNone(self.cache.load(self.filename))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Tests for journal.py."""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from mock import patch
+import plover.dictionary.base as base
+from plover.dictionary.journal import DictionaryJournal
+from plover.logger import LOGGER_NAME
+from plover.steno_dictionary import StenoDictionary
+
+
+class DictionaryJournalTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'dict.json')
+        with open(self.filename, 'wb') as f:
+            f.write('{"S": "a", "T/P": "b"}')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def load(self):
+        with patch.object(base, 'dictionary_cache', None):
+            return base.load_dictionary(self.filename)
+
+    def read_file(self):
+        with open(self.filename, 'rb') as f:
+            return json.load(f)
+
+    def test_replay(self):
+        journal = DictionaryJournal(self.filename)
+        self.assertFalse(journal.exists())
+        journal.append([(('S',), u'c'), (('T', 'P'), None)])
+        journal.append([(('K', 'W'), u'd')])
+        with open(journal.filename, 'ab') as f:
+            f.write('["set", "H"')
+        d = StenoDictionary({('S',): u'a', ('T', 'P'): u'b'})
+        self.assertEqual(journal.replay(d), 3)
+        self.assertEqual(dict(d.iteritems()),
+                         {('S',): u'c', ('K', 'W'): u'd'})
+
+    def test_save_appends_to_journal(self):
+        d = self.load()
+        d[('S',)] = u'c'
+        d[('H',)] = u'd'
+        del d[('T', 'P')]
+        d.save.save()
+        d.save.save()
+        # The dictionary file itself is untouched.
+        self.assertEqual(self.read_file(), {'S': 'a', 'T/P': 'b'})
+        with open(d.save.journal.filename, 'rb') as f:
+            self.assertEqual(len(f.readlines()), 3)
+        loaded = self.load()
+        self.assertEqual(dict(loaded.iteritems()),
+                         {('S',): u'c', ('H',): u'd'})
+        base._scheduler.cancel(d.save, 'compact')
+
+    def test_compact(self):
+        d = self.load()
+        d[('S',)] = u'c'
+        d.save.save()
+        base.flush_all()
+        self.assertFalse(d.save.journal.exists())
+        self.assertEqual(self.read_file(), {'S': 'c', 'T/P': 'b'})
+        self.assertEqual(dict(self.load().iteritems()),
+                         {('S',): u'c', ('T', 'P'): u'b'})
+
+    def test_compact_when_journal_is_large(self):
+        d = self.load()
+        with patch.object(base, 'JOURNAL_COMPACT_SIZE', 1):
+            d[('S',)] = u'c'
+            d.save.save()
+        self.assertFalse(d.save.journal.exists())
+        self.assertEqual(self.read_file(), {'S': 'c', 'T/P': 'b'})
+
+    def test_saves_are_coalesced(self):
+        d = self.load()
+        # Nothing to save.
+        d.save()
+        self.assertNotIn((d.save, 'save'), base._scheduler._pending)
+        with patch.object(base, 'SAVE_DELAY', 60):
+            for i in xrange(10):
+                d[('S',)] = unicode(i)
+                d.save()
+        self.assertEqual(len([k for k in base._scheduler._pending
+                              if k[0] is d.save]), 1)
+        base.flush_all()
+        self.assertEqual(d.save.saved_change_count, 10)
+        self.assertFalse(d.save.journal.exists())
+        self.assertEqual(self.read_file(), {'S': '9', 'T/P': 'b'})
+        self.assertFalse([k for k in base._scheduler._pending 
+                          if k[0] is d.save])
+
+    def test_background_save(self):
+        d = self.load()
+        with patch.object(base, 'SAVE_DELAY', 0):
+            d[('S',)] = u'c'
+            d.save()
+            # The save is done once its compaction is scheduled.
+            for i in xrange(100):
+                if (d.save, 'compact') in base._scheduler._pending:
+                    break
+                time.sleep(0.01)
+        base._scheduler.cancel(d.save, 'compact')
+        self.assertTrue(d.save.journal.exists())
+
+    def test_failed_compact_keeps_changes(self):
+        d = self.load()
+        saver = d.save.saver
+        def failing_saver(d, fp):
+            raise IOError('disk full')
+        d.save.saver = failing_saver
+        d[('T',)] = u'edit'
+        with self.assertRaises(IOError):
+            d.save.compact()
+        self.assertEqual(d.save.pending_keys(), set([('T',)]))
+        d.save.save()
+        base._scheduler.cancel(d.save, 'compact')
+        self.assertEqual(dict(self.load().iteritems()),
+                         {('S',): u'a', ('T', 'P'): u'b', ('T',): u'edit'})
+        d.save.saver = saver
+        base.flush_all()
+        self.assertFalse(d.save.journal.exists())
+        self.assertEqual(self.read_file(), {'S': 'a', 'T/P': 'b', 'T': 'edit'})
+
+    def test_failed_save_is_logged(self):
+        d = self.load()
+        def saver(d, fp):
+            raise IOError('disk full')
+        d.save.saver = saver
+        d[('S',)] = u'c'
+        logged = threading.Event()
+        def exception(message, *args):
+            logged.set()
+        with patch.object(logging.getLogger(LOGGER_NAME), 'exception',
+                          exception):
+            base._scheduler.schedule(d.save, 'compact', 0)
+            logged.wait(5)
+        self.assertTrue(logged.is_set())
+        d.save.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,8 +3,12 @@
 
 """Unit tests for json.py."""
 
+import json
 import unittest
-from json_dict import load_dictionary
+from cStringIO import StringIO
+from mock import patch
+import json_dict
+from json_dict import load_dictionary, save_dictionary
 from base import DictionaryLoaderException
 
 class JsonDictionaryTestCase(unittest.TestCase):
@@ -20,5 +24,38 @@ class JsonDictionaryTestCase(unittest.TestCase):
         with self.assertRaises(DictionaryLoaderException):
             load_dictionary('foo')
 
+    def test_save_dictionary(self):
+        d = {('S', 'T'): u'a', ('P',): u'\xf1', ('A', '-B'): u'"q"', 
+             ('S/T',): u'b'}
+        expected = StringIO()
+        json.dump(dict(('/'.join(k), v) for k, v in d.iteritems()), expected,
+                  sort_keys=True, indent=0, separators=(',', ': '))
+        for batch_size in (1, 2, 1000):
+            with patch.object(json_dict, 'SAVE_BATCH_SIZE', batch_size):
+                f = StringIO()
+                save_dictionary(d, f)
+                self.assertEqual(f.getvalue(), expected.getvalue())
+        f = StringIO()
+        save_dictionary({}, f)
+        self.assertEqual(f.getvalue(), '{}')
+        f = StringIO()
+        save_dictionary(d, f, sort_keys=False)
+        self.assertEqual(json.loads(f.getvalue()), 
+                         json.loads(expected.getvalue()))
+
+    def test_save_dictionary_while_edited(self):
+        d = dict((('S%d' % i,), u'a') for i in range(5))
+        class EditingFile(object):
+            # Edits d between writes, as an edit from another thread could.
+            def __init__(self):
+                self.written = []
+            def write(self, data):
+                self.written.append(data)
+                d[('T%d' % len(self.written),)] = u'b'
+        f = EditingFile()
+        with patch.object(json_dict, 'SAVE_BATCH_SIZE', 1):
+            save_dictionary(d, f, sort_keys=False)
+        self.assertEqual(len(json.loads(''.join(f.written))), 5)
+
 if __name__ == '__main__':
     unittest.main()
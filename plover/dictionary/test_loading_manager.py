@@ -4,9 +4,16 @@
 """Tests for loading_manager.py."""
 
 from collections import defaultdict
+import os
+import shutil
+import tempfile
+import threading
 import unittest
 from mock import patch
+import plover.dictionary.base as base
 import plover.dictionary.loading_manager as loading_manager
+import plover.interning as interning
+from plover.exception import DictionaryLoaderException
 
 
 class DictionaryLoadingManagerTestCase(unittest.TestCase):
@@ -35,6 +42,88 @@ class DictionaryLoadingManagerTestCase(unittest.TestCase):
             # Dropped superfluous files.
             self.assertEqual(['b', 'c'], sorted(manager.dictionaries.keys()))
 
+    def test_progressive_loading(self):
+        files = {'a': 'aaaaa', 'b': 'bbbbb'}
+        loaded = {}
+        done = threading.Event()
+        def callback(filename, d, e):
+            loaded[filename] = (d, e)
+            if len(loaded) == len(files):
+                done.set()
+        with patch('plover.dictionary.loading_manager.load_dictionary', 
+                   files.get):
+            manager = loading_manager.DictionaryLoadingManager()
+            manager.load_progressively(['a', 'b'], callback)
+            done.wait(5)
+        self.assertEqual(loaded, {'a': ('aaaaa', None), 'b': ('bbbbb', None)})
+
+    def test_process_pool(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filenames = []
+            for i in range(4):
+                filename = os.path.join(tmpdir, '%d.json' % i)
+                with open(filename, 'wb') as f:
+                    f.write('{"S/T": "%d", "P": "p"}' % i)
+                filenames.append(filename)
+            with patch('plover.dictionary.base.dictionary_cache', None):
+                manager = loading_manager.DictionaryLoadingManager()
+                manager.set_processes(2)
+                results = manager.load(filenames)
+                self.assertEqual([d[('S', 'T')] for d in results], 
+                                 ['0', '1', '2', '3'])
+                self.assertEqual([d.get_path() for d in results], filenames)
+                self.assertTrue(all(d.longest_key == 2 for d in results))
+                self.assertTrue(all(d.has_prefix(('S',)) for d in results))
+                self.assertTrue(all(d.save for d in results))
+                # Dictionaries loaded together share their translations.
+                self.assertTrue(all(d[('P',)] is results[0][('P',)] 
+                                    for d in results))
+                self.assertIsNone(interning._pools)
+                # The workers are not kept once the files are parsed.
+                self.assertIsNone(manager._pool)
+                with self.assertRaises(DictionaryLoaderException):
+                    manager.load([os.path.join(tmpdir, 'missing.json')])
+                manager.set_processes(0)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_reload_changed_file(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, 'dict.json')
+            with open(filename, 'wb') as f:
+                f.write('{"S": "a"}')
+            with patch('plover.dictionary.base.dictionary_cache', None):
+                manager = loading_manager.DictionaryLoadingManager()
+                d1 = manager.load([filename])[0]
+                self.assertIs(manager.load([filename])[0], d1)
+                with open(filename, 'wb') as f:
+                    f.write('{"S": "b"}')
+                os.utime(filename, (1, 1))
+                d2 = manager.load([filename])[0]
+                self.assertIsNot(d2, d1)
+                self.assertEqual(d2[('S',)], 'b')
+                # Edits to the old copy are saved before it is replaced and
+                # it is no longer saved after.
+                d2[('T',)] = u'edit'
+                with open(filename, 'wb') as f:
+                    f.write('{"S": "c"}')
+                os.utime(filename, (2, 2))
+                d3 = manager.load([filename])[0]
+                self.assertEqual(d3[('T',)], u'edit')
+                d2[('P',)] = u'stale'
+                self.assertEqual(d2.save.pending_keys(), set())
+                self.assertNotIn(d2.save, base._savers)
+                # Saving the new copy doesn't make it be loaded again.
+                d3.save.compact()
+                self.assertIs(manager.load([filename])[0], d3)
+                # Dictionaries that are no longer loaded stop being saved.
+                manager.load([])
+                self.assertNotIn(d3.save, base._savers)
+        finally:
+            shutil.rmtree(tmpdir)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,113 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Tests for mmap_dict.py."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from cStringIO import StringIO
+from plover.dictionary.mmap_dict import (open_dictionary, load_dictionary,
+                                         save_dictionary)
+from plover.dictionary.base import close_dictionary
+from plover.exception import DictionaryLoaderException
+from plover.steno_dictionary import StenoDictionary, StenoDictionaryCollection
+
+
+class MappedDictionaryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'dict.mdict')
+        self.entries = {
+            ('S',): u'a',
+            ('S', 'T'): u'b',
+            ('S', 'T', 'P'): u'a',
+            ('TPH',): u'\xf1',
+        }
+        self.write(self.entries)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, entries):
+        with open(self.filename, 'wb') as f:
+            save_dictionary(entries, f)
+
+    def test_lookup(self):
+        d = open_dictionary(self.filename)
+        self.assertEqual(len(d), 4)
+        self.assertEqual(d.longest_key, 3)
+        self.assertEqual(dict(d.iteritems()), self.entries)
+        self.assertEqual(d[('S', 'T')], u'b')
+        self.assertEqual(d[('TPH',)], u'\xf1')
+        self.assertEqual(d.get(('T',)), None)
+        self.assertIn(('S', 'T', 'P'), d)
+        self.assertNotIn(('S', 'P'), d)
+        self.assertTrue(d.has_prefix(('S',)))
+        self.assertTrue(d.has_prefix(('S', 'T')))
+        self.assertFalse(d.has_prefix(('S', 'T', 'P')))
+        self.assertFalse(d.has_prefix(('TPH',)))
+        self.assertEqual(sorted(d.reverse_lookup(u'a')),
+                         [('S',), ('S', 'T', 'P')])
+        self.assertEqual(d.reverse_lookup(u'\xf1'), [('TPH',)])
+        self.assertEqual(d.reverse_lookup(u'c'), [])
+        with self.assertRaises(TypeError):
+            d[('S',)] = u'c'
+        d.save()
+        d.close()
+
+    def test_empty(self):
+        self.write({})
+        d = open_dictionary(self.filename)
+        self.assertEqual(len(d), 0)
+        self.assertEqual(d.longest_key, 0)
+        self.assertIsNone(d.get(('S',)))
+        d.close()
+
+    def test_bad_file(self):
+        with open(self.filename, 'wb') as f:
+            f.write('{"S": "a"}' * 10)
+        with self.assertRaises(DictionaryLoaderException):
+            open_dictionary(self.filename)
+        with self.assertRaises(DictionaryLoaderException):
+            open_dictionary(os.path.join(self.tmpdir, 'missing.mdict'))
+
+    def test_load_into_memory(self):
+        f = StringIO()
+        save_dictionary(self.entries, f)
+        self.assertEqual(load_dictionary(f.getvalue())._dict, self.entries)
+
+    def test_collection(self):
+        mapped = open_dictionary(self.filename)
+        low = StenoDictionary()
+        low[('S',)] = u'low'
+        low[('W', 'R')] = u'c'
+        high = StenoDictionary()
+        high[('S', 'T')] = u'high'
+        dc = StenoDictionaryCollection()
+        dc.set_dicts([low, mapped, high])
+        self.assertEqual(dc.lookup(('S',)), u'a')
+        self.assertEqual(dc.lookup(('S', 'T')), u'high')
+        self.assertEqual(dc.lookup(('W', 'R')), u'c')
+        self.assertIsNone(dc.lookup(('W',)))
+        self.assertTrue(dc.has_prefix(('S', 'T')))
+        self.assertTrue(dc.has_prefix(('W',)))
+        self.assertEqual(dc.longest_key, 3)
+        self.assertEqual(dc.reverse_lookup(u'\xf1'), [('TPH',)])
+        dc.set_dicts([mapped, low])
+        self.assertEqual(dc.lookup(('S',)), u'low')
+        # New entries go to the highest priority dictionary that isn't read
+        # only.
+        dc.set_dicts([low, mapped])
+        self.assertIs(dc.first_writable_dict(), low)
+        dc.set(('H',), u'new')
+        self.assertEqual(low[('H',)], u'new')
+        close_dictionary(mapped)
+        with self.assertRaises(ValueError):
+            mapped[('S',)]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,10 +2,12 @@
 # See LICENSE.txt for details.
 
 from plover.dictionary.rtfcre_dict import load_dictionary, TranslationConverter, format_translation, save_dictionary
+import plover.dictionary.rtfcre_dict as rtfcre_dict
 import mock
 import re
 import unittest
 from cStringIO import StringIO
+from plover.steno_dictionary import StenoDictionary
 
 class TestCase(unittest.TestCase):
     
@@ -171,16 +173,39 @@ class TestCase(unittest.TestCase):
         # Conflicts result on only the last one kept.
         ('{\\*\\cxs T}t{\\*\\cxs T}g', {'T': 'g'}),
         ('{\\*\\cxs T}t{\\*\\cxs T}return_none', {'T': 't'}),
+        # Escaped entries are part of the translation.
+        ('{\\*\\cxs S}a\\{\\*\\cxs T}b', {'S': 'a\\{\\*\\cxs T}b'}),
+        # Entries without steno are part of the translation.
+        ('{\\*\\cxs S}a{\\*\\cxs }b', {'S': 'a{\\*\\cxs }b'}),
         
         )
         
         patch_path = 'plover.dictionary.rtfcre_dict'
-        with mock.patch.multiple(patch_path, normalize_steno=normalize, 
-                                 TranslationConverter=Converter):
-            for s, expected in cases:
-                expected = dict((normalize(k), convert(v)) 
-                                for k, v in expected.iteritems())
-                assertEqual(load_dictionary(make_dict(s)), expected)
+        # Entries split across chunks are parsed the same.
+        for chunk_size in (1, 3, 64 * 1024):
+            with mock.patch.multiple(patch_path, normalize_steno=normalize, 
+                                     TranslationConverter=Converter,
+                                     CHUNK_SIZE=chunk_size):
+                for s, expected in cases:
+                    expected = dict((normalize(k), convert(v)) 
+                                    for k, v in expected.iteritems())
+                    assertEqual(load_dictionary(make_dict(s)), expected)
+
+    def test_load_dict_in_parallel(self):
+        entries = ['{\\*\\cxs S/T%d}word%d\\cxds ' % (i % 50, i % 7) 
+                   for i in range(200)]
+        entries.append('{\\*\\cxs S/T3}{\\cxp .}')
+        entries.append('{\\*\\cxs S/T1}\\{\\*\\cxs S/T99}\r\n')
+        s = '\r\n'.join([rtfcre_dict.HEADER] + entries + ['}'])
+        with mock.patch.multiple(rtfcre_dict, processes=0):
+            expected = load_dictionary(s)._dict
+        with mock.patch.multiple(rtfcre_dict, processes=2, 
+                                 PARALLEL_MIN_SIZE=0, 
+                                 PARALLEL_CHUNK_SIZE=100):
+            self.assertEqual(load_dictionary(s)._dict, expected)
+        self.assertEqual(len(expected), 50)
+        self.assertEqual(expected[('S', 'T3')], '{.}')
+        self.assertNotIn(('S', 'T99'), expected)
 
     def test_format_translation(self):
         cases = (
@@ -188,7 +213,15 @@ class TestCase(unittest.TestCase):
         ('{^in^}', '\cxds in\cxds '),
         ('{pre^}', 'pre\cxds '),
         ('{pre^} ', 'pre\cxds '),
-        ('{pre^}  ', 'pre\cxds ')
+        ('{pre^}  ', 'pre\cxds '),
+        (r'{.}', r'{\cxp. }'),
+        (r'word{^ing}', r'word \cxds ing'),
+        (r'{^-^}', r'\cxds -\cxds '),
+        (r'{&a}{&b}', r'{\cxfing a} {\cxfing b}'),
+        (r'{#Return}{PLOVER:add}', r'\{#Return\} \{PLOVER:add\}'),
+        (r'say \"hi\"', r'say "hi"'),
+        # Escaped braces can take part in conversions across metas.
+        (r'{#\{^-^}{&a}', r'\{#\\cxds -\cxds  {\cxfing a\}'),
         )
         
         failed = False
@@ -210,6 +243,33 @@ class TestCase(unittest.TestCase):
         expected = '{\\rtf1\\ansi{\\*\\cxrev100}\\cxdict{\\*\\cxsystem Plover}{\\stylesheet{\\s0 Normal;}}\r\n{\\*\\cxs S///T}pre\\cxds \r\n}\r\n' 
         self.assertEqual(f.getvalue(), expected)
 
+    def test_save_dictionary_in_batches(self):
+        d = dict((('S%d' % i, 'T'), '{^%d}' % (i % 3)) for i in range(25))
+        f = StringIO()
+        with mock.patch.object(rtfcre_dict, 'SAVE_BATCH_SIZE', 10):
+            save_dictionary(d, f)
+        expected = [rtfcre_dict.HEADER]
+        expected.extend('{\\*\\cxs %s}\\cxds %s\r\n' % ('/'.join(k), v[2]) 
+                        for k, v in d.iteritems())
+        expected.append('}\r\n')
+        self.assertEqual(f.getvalue(), ''.join(expected))
+
+    def test_save_dictionary_while_edited(self):
+        d = StenoDictionary()
+        for i in range(25):
+            d[('S%d' % i,)] = u'a'
+        class EditingFile(object):
+            # Edits d between writes, as an edit from another thread could.
+            def __init__(self):
+                self.written = []
+            def write(self, data):
+                self.written.append(data)
+                d[('T%d' % len(self.written),)] = u'b'
+        f = EditingFile()
+        with mock.patch.object(rtfcre_dict, 'SAVE_BATCH_SIZE', 10):
+            save_dictionary(d, f)
+        self.assertEqual(''.join(f.written).count('cxs S'), 25)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,159 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Tests for sqlite_dict.py."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from cStringIO import StringIO
+from plover.dictionary.sqlite_dict import (open_dictionary, load_dictionary,
+                                           save_dictionary)
+from plover.dictionary.base import convert_dictionary
+import plover.dictionary.base as base
+from plover.exception import DictionaryLoaderException
+from plover.steno_dictionary import StenoDictionary, StenoDictionaryCollection
+
+
+class SQLiteDictionaryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'dict.sqlite')
+        self.entries = {
+            ('S',): u'a',
+            ('S', 'T'): u'b',
+            ('S', 'T', 'P'): u'a',
+            ('TPH',): u'\xf1',
+        }
+        self.write(self.entries)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, entries):
+        with open(self.filename, 'wb') as f:
+            save_dictionary(entries, f)
+
+    def test_lookup(self):
+        d = open_dictionary(self.filename)
+        self.assertFalse(d.in_memory)
+        self.assertEqual(len(d), 4)
+        self.assertEqual(d.longest_key, 3)
+        self.assertEqual(dict(d.iteritems()), self.entries)
+        self.assertEqual(d[('S', 'T')], u'b')
+        self.assertEqual(d[('TPH',)], u'\xf1')
+        self.assertEqual(d.get(('T',)), None)
+        self.assertIn(('S', 'T', 'P'), d)
+        self.assertNotIn(('S', 'P'), d)
+        self.assertTrue(d.has_prefix(('S',)))
+        self.assertTrue(d.has_prefix(('S', 'T')))
+        self.assertFalse(d.has_prefix(('S', 'T', 'P')))
+        self.assertFalse(d.has_prefix(('TPH',)))
+        self.assertEqual(sorted(d.reverse_lookup(u'a')),
+                         [('S',), ('S', 'T', 'P')])
+        self.assertEqual(d.reverse_lookup(u'c'), [])
+        d.close()
+
+    def test_edits_are_written_immediately(self):
+        d = open_dictionary(self.filename)
+        changes = []
+        def listener(d, key, old_value, new_value):
+            changes.append((key, old_value, new_value))
+        d.add_entry_listener(listener)
+        d[('S', 'T', 'P', 'H')] = 'c'
+        self.assertEqual(d.longest_key, 4)
+        d[('S',)] = u'd'
+        del d[('S', 'T', 'P', 'H')]
+        self.assertEqual(d.longest_key, 3)
+        with self.assertRaises(KeyError):
+            del d[('W',)]
+        self.assertEqual(changes, [
+            (('S', 'T', 'P', 'H'), None, 'c'),
+            (('S',), u'a', u'd'),
+            (('S', 'T', 'P', 'H'), u'c', None),
+        ])
+        d.save()
+        # Another connection sees the edits without saving.
+        other = open_dictionary(self.filename)
+        self.assertEqual(other[('S',)], u'd')
+        self.assertNotIn(('S', 'T', 'P', 'H'), other)
+        other[('W', 'R', 'T', 'S', 'P')] = u'e'
+        d.refresh()
+        self.assertEqual(d.longest_key, 5)
+        other.close()
+        d.close()
+
+    def test_bad_file(self):
+        with open(self.filename, 'wb') as f:
+            f.write('{"S": "a"}' * 10)
+        with self.assertRaises(DictionaryLoaderException):
+            open_dictionary(self.filename)
+        with self.assertRaises(DictionaryLoaderException):
+            open_dictionary(os.path.join(self.tmpdir, 'missing.sqlite'))
+
+    def test_load_into_memory(self):
+        f = StringIO()
+        save_dictionary(self.entries, f)
+        self.assertEqual(load_dictionary(f.getvalue())._dict, self.entries)
+
+    def test_import_and_export(self):
+        cache = base.dictionary_cache
+        base.dictionary_cache = None
+        try:
+            source = os.path.join(self.tmpdir, 'source.json')
+            with open(source, 'wb') as f:
+                json.dump({'S/T': 'b', 'TPH': 'c'}, f)
+            target = os.path.join(self.tmpdir, 'imported.sqlite')
+            convert_dictionary(source, target)
+            d = base.load_dictionary(target)
+            self.assertEqual(dict(d.iteritems()),
+                             {('S', 'T'): u'b', ('TPH',): u'c'})
+            d.close()
+            exported = os.path.join(self.tmpdir, 'exported.json')
+            convert_dictionary(self.filename, exported)
+            d = base.load_dictionary(exported)
+            self.assertEqual(dict(d.iteritems()), self.entries)
+            rtf = os.path.join(self.tmpdir, 'source.rtf')
+            convert_dictionary(source, rtf)
+            convert_dictionary(rtf, target)
+            d = base.load_dictionary(target)
+            self.assertEqual(d[('S', 'T')], u'b')
+            d.close()
+        finally:
+            base.dictionary_cache = cache
+
+    def test_collection(self):
+        stored = open_dictionary(self.filename)
+        low = StenoDictionary()
+        low[('S',)] = u'low'
+        low[('W', 'R')] = u'c'
+        high = StenoDictionary()
+        high[('S', 'T')] = u'high'
+        dc = StenoDictionaryCollection()
+        dc.set_dicts([low, stored, high])
+        self.assertEqual(dc.lookup(('S',)), u'a')
+        self.assertEqual(dc.lookup(('S', 'T')), u'high')
+        self.assertEqual(dc.lookup(('W', 'R')), u'c')
+        self.assertIsNone(dc.lookup(('W',)))
+        self.assertTrue(dc.has_prefix(('S', 'T')))
+        self.assertEqual(dc.longest_key, 3)
+        self.assertEqual(dc.reverse_lookup(u'\xf1'), [('TPH',)])
+        stored[('K', 'W', 'R', 'T')] = u'f'
+        self.assertEqual(dc.longest_key, 4)
+        self.assertEqual(dc.lookup(('K', 'W', 'R', 'T')), u'f')
+        # Keys that were in the file before are not in the collection's
+        # prefix counts.
+        del stored[('S', 'T', 'P')]
+        del stored[('K', 'W', 'R', 'T')]
+        self.assertEqual(dc.longest_key, 2)
+        self.assertIsNone(dc.lookup(('S', 'T', 'P')))
+        self.assertTrue(dc.has_prefix(('W',)))
+        self.assertFalse(dc.has_prefix(('S', 'T')))
+        stored.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
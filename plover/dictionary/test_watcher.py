@@ -0,0 +1,75 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Tests for watcher.py and reloading changed dictionaries."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from mock import patch
+import plover.dictionary.base as base
+from plover.dictionary.watcher import DictionaryWatcher
+
+
+class DictionaryWatcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'dict.json')
+        self.write('{"S": "a", "T/P": "b"}', 1)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, data, mtime):
+        with open(self.filename, 'wb') as f:
+            f.write(data)
+        os.utime(self.filename, (mtime, mtime))
+
+    def test_check(self):
+        changed = []
+        watcher = DictionaryWatcher(changed.append, use_inotify=False)
+        missing = os.path.join(self.tmpdir, 'missing.json')
+        with patch('plover.dictionary.watcher.POLL_INTERVAL', 60):
+            watcher.set_files([self.filename, missing])
+        watcher.check()
+        self.assertEqual(changed, [])
+        self.write('{"S": "c"}', 2)
+        watcher.check()
+        watcher.check()
+        self.assertEqual(changed, [self.filename])
+        watcher.set_files([])
+        self.write('{"S": "d"}', 3)
+        watcher.check()
+        self.assertEqual(changed, [self.filename])
+        watcher.stop()
+
+    def test_apply_changes(self):
+        with patch.object(base, 'dictionary_cache', None):
+            d = base.load_dictionary(self.filename)
+            d[('H',)] = u'local'
+            self.write('{"S": "c", "K": "d"}', 2)
+            changes = base.read_changes(d, self.filename)
+        self.assertEqual(sorted(changes), 
+                         [(('K',), u'd'), (('S',), u'c'), (('T', 'P'), None)])
+        base.apply_changes(d, changes)
+        # The unsaved edit is kept.
+        self.assertEqual(dict(d.iteritems()), 
+                         {('S',): u'c', ('K',): u'd', ('H',): u'local'})
+        self.assertEqual(d.longest_key, 1)
+        # Changes read from the file are not saved back to it.
+        self.assertEqual(d.save.pending_keys(), set([('H',)]))
+
+    def test_own_writes(self):
+        with patch.object(base, 'dictionary_cache', None):
+            d = base.load_dictionary(self.filename)
+        self.assertFalse(base.written_by_plover(self.filename))
+        d[('H',)] = u'local'
+        d.save.compact()
+        self.assertTrue(base.written_by_plover(self.filename))
+        self.write('{"S": "c"}', 2)
+        self.assertFalse(base.written_by_plover(self.filename))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Watch dictionary files for changes made by other programs.
+
+inotify is used when pyinotify is installed. Otherwise the files are polled
+with os.stat, which only costs one system call per file per interval.
+
+"""
+
+import os
+import threading
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+# How often to poll files when inotify is not available, in seconds.
+POLL_INTERVAL = 1.0
+
+
+def file_signature(filename):
+    """The modification time and size of filename, None if it is missing."""
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size
+
+
+class DictionaryWatcher(object):
+    """Calls callback(filename) from a background thread when a file changes.
+
+    A file counts as changed when its modification time or size differs from
+    what it was when it was last checked. Files that are missing are ignored
+    until they reappear.
+
+    """
+
+    def __init__(self, callback, use_inotify=True):
+        self._callback = callback
+        self._signatures = {}
+        self._lock = threading.Lock()
+        self._use_inotify = use_inotify and pyinotify is not None
+        self._thread = None
+        self._stop = threading.Event()
+        self._notifier = None
+        self._watches = {}
+
+    def set_files(self, filenames):
+        """Watch filenames instead of the files watched before."""
+        with self._lock:
+            self._signatures = {f: file_signature(f) for f in filenames}
+        if self._use_inotify:
+            self._update_inotify()
+        elif filenames and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._poll)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def get_files(self):
+        with self._lock:
+            return self._signatures.keys()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+        if self._notifier:
+            self._notifier.stop()
+            self._notifier = None
+            self._watches = {}
+
+    def check(self):
+        """Check all files now and call the callback for changed ones."""
+        with self._lock:
+            filenames = self._signatures.keys()
+        for filename in filenames:
+            self._check(filename)
+
+    def _check(self, filename):
+        signature = file_signature(filename)
+        with self._lock:
+            if filename not in self._signatures:
+                return
+            changed = (signature is not None and 
+                       signature != self._signatures[filename])
+            self._signatures[filename] = signature
+        if changed:
+            self._callback(filename)
+
+    def _poll(self):
+        while not self._stop.wait(POLL_INTERVAL):
+            self.check()
+
+    def _update_inotify(self):
+        if self._notifier is None:
+            manager = pyinotify.WatchManager()
+            self._notifier = pyinotify.ThreadedNotifier(manager, 
+                                                        self._inotify_event)
+            self._notifier.daemon = True
+            self._notifier.start()
+        manager = self._notifier._watch_manager
+        # Directories are watched since saves usually replace the file.
+        directories = set(os.path.dirname(os.path.abspath(f)) 
+                          for f in self.get_files())
+        for directory in set(self._watches) - directories:
+            manager.rm_watch(self._watches.pop(directory).values())
+        mask = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO
+        for directory in directories - set(self._watches):
+            self._watches[directory] = manager.add_watch(directory, mask)
+
+    def _inotify_event(self, event):
+        pathname = event.pathname
+        for filename in self.get_files():
+            if os.path.abspath(filename) == pathname:
+                self._check(filename)
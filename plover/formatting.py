@@ -161,6 +161,10 @@ class _Action(object):
     context to render future translations.
 
     """
+
+    __slots__ = ('attach', 'glue', 'word', 'capitalize', 'lower', 'orthography',
+                 'text', 'replace', 'combo', 'command')
+
     def __init__(self, attach=False, glue=False, word='', capitalize=False, 
                  lower=False, orthography=True, text='', replace='', combo='', 
                  command=''):
@@ -220,13 +224,24 @@ class _Action(object):
         return a
         
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        # Instructions differ most often so they are compared first.
+        return (self.text == other.text and
+                self.replace == other.replace and
+                self.combo == other.combo and
+                self.command == other.command and
+                self.word == other.word and
+                self.attach == other.attach and
+                self.glue == other.glue and
+                self.capitalize == other.capitalize and
+                self.lower == other.lower and
+                self.orthography == other.orthography)
 
     def __ne__(self, other):
         return not self == other
 
     def __str__(self):
-        return 'Action(%s)' % str(self.__dict__)
+        return 'Action(%s)' % str(dict((name, getattr(self, name)) 
+                                       for name in self.__slots__))
 
     def __repr__(self):
         return str(self)
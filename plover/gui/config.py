@@ -314,9 +314,13 @@ class DictionaryConfig(ScrolledPanel):
 
         main_sizer.Add(self.dicts_sizer)
         
-        self.mask = 'Json files (*%s)|*%s|RTF/CRE files (*%s)|*%s' % (
+        self.mask = ('Json files (*%s)|*%s|RTF/CRE files (*%s)|*%s|'
+                     'Compiled dictionaries (*%s)|*%s|'
+                     'SQLite dictionaries (*%s)|*%s') % (
             conf.JSON_EXTENSION, conf.JSON_EXTENSION, 
             conf.RTF_EXTENSION, conf.RTF_EXTENSION, 
+            conf.MMAP_EXTENSION, conf.MMAP_EXTENSION, 
+            conf.SQLITE_EXTENSION, conf.SQLITE_EXTENSION, 
         )
         
         self.SetSizer(main_sizer)
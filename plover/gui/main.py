@@ -21,6 +21,7 @@ from plover.oslayer.keyboardcontrol import KeyboardEmulation
 from plover.machine.base import STATE_ERROR, STATE_INITIALIZING, STATE_RUNNING
 from plover.machine.registry import machine_registry
 from plover.exception import InvalidConfigurationError
+from plover.steno_dictionary import FAILED
 from plover.gui.paper_tape import StrokeDisplayDialog
 
 from plover import __name__ as __software_name__
@@ -175,6 +176,8 @@ class MainFrame(wx.Frame):
             lambda s: wx.CallAfter(self._update_status, s))
         self.steno_engine.set_output(
             Output(self.consume_command, self.steno_engine))
+        self.steno_engine.get_dictionary().add_load_listener(
+            self._dictionary_load_changed)
 
         while True:
             try:
@@ -295,6 +298,13 @@ class MainFrame(wx.Frame):
         info.License = __license__
         wx.AboutBox(info)
 
+    def _dictionary_load_changed(self, path, state):
+        # Dictionaries loaded progressively report their errors here instead
+        # of raising InvalidConfigurationError.
+        if state == FAILED:
+            error = self.steno_engine.get_dictionary().get_load_error(path)
+            wx.CallAfter(self._show_alert, unicode(error))
+
     def _show_alert(self, message):
         alert_dialog = wx.MessageDialog(self,
                                         message,
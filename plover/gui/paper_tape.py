@@ -118,7 +118,7 @@ class StrokeDisplayDialog(wx.Dialog):
 
     def paper_format(self, stroke):
         text = [' '] * len(ALL_KEYS)
-        keys = stroke.steno_keys[:]
+        keys = list(stroke.steno_keys)
         if any(key in REVERSE_NUMBERS for key in keys):
             keys.append('#')
         for key in keys:
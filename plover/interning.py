@@ -0,0 +1,132 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Sharing of equal translations.
+
+Dictionaries overlap a lot: the main dictionary, the user's dictionary and the
+misstroke and suffix dictionaries contain many of the same translations, and
+misstroke entries repeat translations within a dictionary. Each loader would
+normally allocate its own copy of all of them. Running translations through
+intern_translations makes equal ones share one copy instead. Strokes are
+already shared by the cache of normalize_steno, and sharing outlines saved
+nothing on the bundled dictionaries for the time it took.
+
+The pools of shared objects only exist while something is being loaded. They
+are opened by sharing() and dropped when the last caller using them is done,
+so they never keep translations alive after their dictionaries have been
+edited or reloaded. Dictionaries loaded in the same sharing() block share
+their translations with each other.
+
+"""
+
+import collections
+import contextlib
+import sys
+import threading
+
+class _Pools(object):
+
+    def __init__(self):
+        # Translations are pooled by type so that a unicode translation never
+        # comes back as an equal str or the other way around.
+        self.translations = {str: {}, unicode: {}}
+
+    def size(self):
+        """The bytes used by the pools themselves."""
+        pools = [self.translations]
+        pools.extend(self.translations.itervalues())
+        return sum(sys.getsizeof(pool) for pool in pools)
+
+_lock = threading.Lock()
+_pools = None
+_users = 0
+
+def begin_sharing():
+    """Open the pools, or keep the open ones until end_sharing is called."""
+    global _pools, _users
+    with _lock:
+        if _pools is None:
+            _pools = _Pools()
+        _users += 1
+
+def end_sharing():
+    """Drop the pools if no one else is using them."""
+    global _pools, _users
+    with _lock:
+        _users -= 1
+        if not _users:
+            _pools = None
+
+@contextlib.contextmanager
+def sharing():
+    """Share the objects interned in this block and in overlapping ones."""
+    begin_sharing()
+    try:
+        yield
+    finally:
+        end_sharing()
+
+def intern_translation(translation):
+    """Return the shared copy of a translation.
+
+    Translations are returned unchanged outside of sharing().
+
+    """
+    pools = _pools
+    if pools is None:
+        return translation
+    pool = pools.translations.get(type(translation))
+    if pool is None:
+        return translation
+    return pool.setdefault(translation, translation)
+
+def intern_translations(translations):
+    """Return a list of the shared copies of translations.
+
+    This is the same as calling intern_translation on each of them in a
+    sharing() block, only faster: when they all have the same type they are
+    interned by a single map, without running Python code for each of them.
+
+    """
+    with sharing():
+        types = set(map(type, translations))
+        pool = None
+        if len(types) == 1:
+            pool = _pools.translations.get(types.pop())
+        if pool is None:
+            return map(intern_translation, translations)
+        return map(pool.setdefault, translations, translations)
+
+MemoryReport = collections.namedtuple('MemoryReport',
+                                      'entries bytes unshared_bytes')
+
+def memory_report(dictionaries):
+    """Measure how much memory the entries of dictionaries take.
+
+    Returns the number of entries, the bytes used by their outlines, strokes
+    and translations, and the bytes they would use if every entry had its own
+    copy of each of them. The difference is the memory saved by sharing. The
+    bytes used include the pools, if they are open.
+
+    """
+    getsizeof = sys.getsizeof
+    seen = set()
+    entries = 0
+    total = 0
+    unshared = 0
+    for d in dictionaries:
+        for key, value in d.iteritems():
+            entries += 1
+            objects = [key, value]
+            if type(key) is tuple:
+                objects.extend(key)
+            for o in objects:
+                size = getsizeof(o)
+                unshared += size
+                if id(o) not in seen:
+                    seen.add(id(o))
+                    total += size
+    pools = _pools
+    if pools is not None:
+        total += pools.size()
+    return MemoryReport(entries, total, unshared)
@@ -11,6 +11,9 @@ LOG_FORMAT = '%(asctime)s %(message)s'
 LOG_MAX_BYTES = 10000000
 LOG_COUNT = 9
 
+# Nothing is logged unless a log file is set.
+logging.getLogger(LOGGER_NAME).addHandler(logging.NullHandler())
+
 class Logger(object):
     def __init__(self):
         self._logger = logging.getLogger(LOGGER_NAME)
@@ -3,6 +3,7 @@
 
 "Launch the plover application."
 
+import multiprocessing
 import os
 import shutil
 import sys
@@ -21,6 +22,7 @@ from collections import OrderedDict
 
 import plover.gui.main
 import plover.oslayer.processlock
+import plover.dictionary.base
 from plover.oslayer.config import CONFIG_DIR, ASSETS_DIR
 from plover.config import CONFIG_FILE, DEFAULT_DICTIONARY_FILE, Config
 
@@ -66,6 +68,8 @@ def init_config_dir():
 
 def main():
     """Launch plover."""
+    # Dictionaries may be loaded in worker processes.
+    multiprocessing.freeze_support()
     try:
         # Ensure only one instance of Plover is running at a time.
         with plover.oslayer.processlock.PloverLock():
@@ -76,6 +80,7 @@ def main():
             gui.MainLoop()
             with open(config.target_file, 'wb') as f:
                 config.save(f)
+            plover.dictionary.base.flush_all()
     except plover.oslayer.processlock.LockNotAcquiredException:
         show_error('Error', 'Another instance of Plover is already running.')
     except:
@@ -11,28 +11,68 @@ Stroke -- A data model class that encapsulates a sequence of steno keys.
 
 """
 
-import re
+import collections
 
 STROKE_DELIMITER = '/'
 IMPLICIT_HYPHENS = set('AOEU*50')
 
+# Character classes used by _normalize_stroke.
+_DIGITS = frozenset('0123456789')
+_IMPLICIT_HYPHENS = frozenset(IMPLICIT_HYPHENS)
+
+# Normalized strokes are cached by their raw form. Dictionaries share most of
+# their strokes so the cache stays small; it is emptied if it fills up.
+NORMALIZE_CACHE_SIZE = 100000
+_normalize_cache = {}
+# Hit and miss counts for the cache, reported by normalize_cache_info.
+_normalize_counts = [0, 0]
+
+NormalizeCacheInfo = collections.namedtuple('NormalizeCacheInfo', 
+                                            'hits misses maxsize currsize')
+
+def _normalize_stroke(stroke):
+    if '#' in stroke:
+        stroke = stroke.replace('#', '')
+        if _DIGITS.isdisjoint(stroke):
+            stroke = '#' + stroke
+    if not _IMPLICIT_HYPHENS.isdisjoint(stroke):
+        stroke = stroke.replace('-', '')
+    if stroke.endswith('-'):
+        stroke = stroke[:-1]
+    return stroke
+
 def normalize_steno(strokes_string):
     """Convert steno strings to one common form."""
     strokes = strokes_string.split(STROKE_DELIMITER)
+    cache = _normalize_cache
     normalized_strokes = []
+    misses = 0
     for stroke in strokes:
-        if '#' in stroke:
-            stroke = stroke.replace('#', '')
-            if not re.search('[0-9]', stroke):
-                stroke = '#' + stroke
-        has_implicit_dash = bool(set(stroke) & IMPLICIT_HYPHENS)
-        if has_implicit_dash:
-            stroke = stroke.replace('-', '')
-        if stroke.endswith('-'):
-            stroke = stroke[:-1]
-        normalized_strokes.append(stroke)
+        try:
+            normalized_strokes.append(cache[stroke])
+        except KeyError:
+            misses += 1
+            normalized = _normalize_stroke(stroke)
+            if len(cache) >= NORMALIZE_CACHE_SIZE:
+                cache.clear()
+            cache[stroke] = normalized
+            normalized_strokes.append(normalized)
+    counts = _normalize_counts
+    counts[0] += len(strokes) - misses
+    counts[1] += misses
     return tuple(normalized_strokes)
 
+def normalize_cache_info():
+    """Return the hit and miss counts and the size of the stroke cache."""
+    hits, misses = _normalize_counts
+    return NormalizeCacheInfo(hits, misses, NORMALIZE_CACHE_SIZE, 
+                              len(_normalize_cache))
+
+def clear_normalize_cache():
+    """Empty the stroke cache and reset its counters."""
+    _normalize_cache.clear()
+    _normalize_counts[:] = [0, 0]
+
 STENO_KEY_NUMBERS = {'S-': '1-',
                      'T-': '2-',
                      'P-': '3-',
@@ -69,7 +109,83 @@ STENO_KEY_ORDER = {"#": 0,
                    "-Z": 22}
 
 
-class Stroke:
+# Each steno key is assigned a bit so a chord can be represented as an int.
+STENO_KEY_BITS = dict((k, 1 << v) for k, v in STENO_KEY_ORDER.iteritems())
+
+def keys_to_mask(steno_keys):
+    """Convert a sequence of steno keys to a bitmask.
+
+    Returns None if any key is not one of the standard steno keys.
+
+    """
+    mask = 0
+    bits = STENO_KEY_BITS
+    for k in steno_keys:
+        bit = bits.get(k)
+        if bit is None:
+            return None
+        mask |= bit
+    return mask
+
+def mask_to_keys(mask):
+    """Convert a bitmask to a list of steno keys in steno order."""
+    return [k for k, bit in _ORDERED_KEY_BITS if mask & bit]
+
+_ORDERED_KEY_BITS = sorted(STENO_KEY_BITS.items(), key=lambda x: x[1])
+
+def _format_keys(steno_keys):
+    """Order steno keys and build their RTF/CRE string.
+
+    Returns a tuple of the ordered list of keys, with number bar strokes
+    converted to numbers, and the RTF/CRE string.
+
+    """
+    # Remove duplicate keys and save local versions of the input 
+    # parameters.
+    steno_keys_set = set(steno_keys)
+    steno_keys = list(steno_keys_set)
+
+    # Order the steno keys so comparisons can be made.
+    steno_keys.sort(key=lambda x: STENO_KEY_ORDER.get(x, -1))
+     
+    # Convert strokes involving the number bar to numbers.
+    if '#' in steno_keys:
+        numeral = False
+        for i, e in enumerate(steno_keys):
+            if e in STENO_KEY_NUMBERS:
+                steno_keys[i] = STENO_KEY_NUMBERS[e]
+                numeral = True
+        if numeral:
+            steno_keys.remove('#')
+    
+    if steno_keys_set & Stroke.IMPLICIT_HYPHEN:
+        rtfcre = ''.join(key.strip('-') for key in steno_keys)
+    else:
+        pre = ''.join(k.strip('-') for k in steno_keys if k[-1] == '-' or 
+                      k == '#')
+        post = ''.join(k.strip('-') for k in steno_keys if k[0] == '-')
+        rtfcre = '-'.join([pre, post]) if post else pre
+
+    return steno_keys, rtfcre
+
+# Shared strokes by the set of keys pressed, see Stroke.from_keys. Writers use a
+# few thousand distinct chords; the cache is emptied if it fills up.
+STROKE_CACHE_SIZE = 10000
+_strokes = {}
+
+# Formatted keys and RTF/CRE strings for each bitmask seen so far. The number
+# of distinct chords in use is small so this is built lazily.
+_MASK_FORMATS = {}
+
+def _format_mask(mask):
+    result = _MASK_FORMATS.get(mask)
+    if result is None:
+        steno_keys, rtfcre = _format_keys(mask_to_keys(mask))
+        result = _MASK_FORMATS[mask] = (tuple(steno_keys), rtfcre)
+    return result
+
+
+class Stroke(object):
     """A standardized data model for stenotype machine strokes.
 
     This class standardizes the representation of a stenotype chord. A stenotype
@@ -80,10 +196,17 @@ class Stroke:
     stenographic ordering on the keys, and combines the keys into a single
     string (called RTFCRE for historical reasons).
 
+    Chords made only of standard steno keys are also represented as an integer
+    bitmask (keymask) of the pressed keys. The ordered keys and RTFCRE string
+    for a bitmask are only computed the first time that chord is seen. Strokes
+    with non-standard keys have a keymask of None.
+
     """
 
     IMPLICIT_HYPHEN = set(('A-', 'O-', '5-', '0-', '-E', '-U', '*'))
 
+    __slots__ = ('steno_keys', 'rtfcre', 'keymask', 'is_correction')
+
     def __init__(self, steno_keys) :
         """Create a steno stroke by formatting steno keys.
 
@@ -92,37 +215,40 @@ class Stroke:
         steno_keys -- A sequence of pressed keys.
 
         """
-        # Remove duplicate keys and save local versions of the input 
-        # parameters.
-        steno_keys_set = set(steno_keys)
-        steno_keys = list(steno_keys_set)
-
-        # Order the steno keys so comparisons can be made.
-        steno_keys.sort(key=lambda x: STENO_KEY_ORDER.get(x, -1))
-         
-        # Convert strokes involving the number bar to numbers.
-        if '#' in steno_keys:
-            numeral = False
-            for i, e in enumerate(steno_keys):
-                if e in STENO_KEY_NUMBERS:
-                    steno_keys[i] = STENO_KEY_NUMBERS[e]
-                    numeral = True
-            if numeral:
-                steno_keys.remove('#')
-        
-        if steno_keys_set & self.IMPLICIT_HYPHEN:
-            self.rtfcre = ''.join(key.strip('-') for key in steno_keys)
+        mask = keys_to_mask(steno_keys)
+        if mask is None:
+            steno_keys, self.rtfcre = _format_keys(steno_keys)
+            steno_keys = tuple(steno_keys)
         else:
-            pre = ''.join(k.strip('-') for k in steno_keys if k[-1] == '-' or 
-                          k == '#')
-            post = ''.join(k.strip('-') for k in steno_keys if k[0] == '-')
-            self.rtfcre = '-'.join([pre, post]) if post else pre
-
+            steno_keys, self.rtfcre = _format_mask(mask)
+        self.keymask = mask
         self.steno_keys = steno_keys
 
         # Determine if this stroke is a correction stroke.
         self.is_correction = (self.rtfcre == '*')
 
+    @classmethod
+    def from_keys(cls, steno_keys):
+        """Return a shared stroke for a sequence of pressed keys.
+
+        The same stroke is returned every time the same keys are pressed, so
+        the result must not be modified. Its steno_keys are a tuple.
+
+        """
+        keys = frozenset(steno_keys)
+        stroke = _strokes.get(keys)
+        if stroke is None:
+            stroke = cls(steno_keys)
+            if len(_strokes) >= STROKE_CACHE_SIZE:
+                _strokes.clear()
+            _strokes[keys] = stroke
+        return stroke
+
+    @classmethod
+    def from_mask(cls, mask):
+        """Create a stroke from a bitmask of steno keys."""
+        return cls(mask_to_keys(mask))
+
     def __str__(self):
         if self.is_correction:
             prefix = '*'
@@ -131,12 +257,16 @@ class Stroke:
         return '%sStroke(%s : %s)' % (prefix, self.rtfcre, self.steno_keys)
 
     def __eq__(self, other):
-        return (isinstance(other, Stroke)
-                and self.steno_keys == other.steno_keys)
+        if self is other:
+            return True
+        if not isinstance(other, Stroke):
+            return False
+        if self.keymask is not None and other.keymask is not None:
+            return self.keymask == other.keymask
+        return self.steno_keys == other.steno_keys
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
     def __repr__(self):
         return str(self)
-
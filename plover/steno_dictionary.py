@@ -10,33 +10,127 @@ A steno dictionary maps sequences of steno strokes to translations.
 import collections
 import itertools
 from steno import normalize_steno
+from interning import intern_translations
+
+# Load states of the dictionaries in a collection.
+LOADING = 'loading'
+LOADED = 'loaded'
+FAILED = 'failed'
+
+# The number of keys a collection remembers as missing from its dictionaries.
+MISS_CACHE_SIZE = 10000
+
+MissCacheInfo = collections.namedtuple('MissCacheInfo', 
+                                       'hits misses maxsize currsize')
 
 class StenoDictionary(collections.MutableMapping):
     """A steno dictionary.
 
     This dictionary maps immutable sequences to translations and tracks the
-    length of the longest key.
+    length of the longest key, using a count of keys by length so that it stays
+    exact without rescanning the keys. It also counts the proper prefixes of
+    its keys so that callers can tell when no key can start with a given
+    sequence.
+
+    The reverse index from translations to keys is only built on the first
+    reverse lookup and is then kept up to date. It can be disabled entirely to
+    save memory, in which case reverse lookups scan the dictionary.
+
+    Translations loaded in bulk are interned so that dictionaries loaded
+    together share equal translations.
 
     Attributes:
     longest_key -- A read only property holding the length of the longest key.
     save -- If set, is a function that will save this dictionary.
+    in_memory -- Whether the entries are held in memory. Collections only
+    merge such dictionaries into their index; others are asked directly.
+    readonly -- Whether entries can't be set or deleted. Collections save
+    new entries to their first dictionary that is not read only.
+    generation -- A count that goes up whenever lookups may have a different
+    result, on changes to the entries or the filters.
 
     """
+
+    in_memory = True
+    readonly = False
+
     def __init__(self, *args, **kw):
         self._dict = {}
         self._longest_key_length = 0
         self._longest_listener_callbacks = set()
-        self.reverse = collections.defaultdict(list)
+        self._entry_listener_callbacks = set()
+        self._prefixes = {}
+        self._key_lengths = {}
+        self._reverse = None
+        self._reverse_enabled = True
         self.filters = []
+        self.generation = 0
         self.update(*args, **kw)
         self.save = None
         self._path = ''
 
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Create a dictionary from an iterable of (key, value) pairs.
+
+        This is much faster than adding the entries one at a time: the entries
+        are put straight into the backing dict and the indexes are built in
+        one pass over the keys. Later pairs replace earlier ones with the same
+        key. Translations are interned, see plover.interning.
+
+        """
+        d = cls()
+        entries = dict(pairs)
+        entries = d._dict = dict(itertools.izip(
+            entries.keys(), intern_translations(entries.values())))
+        prefixes = d._prefixes
+        lengths = d._key_lengths
+        for key in entries:
+            n = len(key)
+            lengths[n] = lengths.get(n, 0) + 1
+            if n > 1:
+                _add_prefixes(prefixes, key)
+        d._longest_key_length = max(lengths or [0])
+        return d
+
     @property
     def longest_key(self):
         """The length of the longest key in the dict."""
         return self._longest_key
 
+    def __getstate__(self):
+        """Return the entries and derived indexes as plain builtin types.
+
+        The entries are a list of keys, a list of distinct translations and
+        the position of each key's translation in that list, so that each
+        translation is only stored and loaded once. This must not run while
+        the dictionary is being changed.
+
+        """
+        keys = self._dict.keys()
+        values = self._dict.values()
+        if len(set(map(type, values))) > 1:
+            # Equal str and unicode values must not be merged.
+            distinct = values
+            positions = range(len(values))
+        else:
+            distinct = list(set(values))
+            index = dict(itertools.izip(distinct, itertools.count()))
+            positions = map(index.__getitem__, values)
+        return {'entries': (keys, positions, distinct),
+                'prefixes': self._prefixes,
+                'key_lengths': self._key_lengths}
+
+    def __setstate__(self, state):
+        self.__init__()
+        keys, positions, distinct = state['entries']
+        translations = intern_translations(distinct)
+        self._dict = dict(itertools.izip(
+            keys, map(translations.__getitem__, positions)))
+        self._prefixes = state['prefixes']
+        self._key_lengths = state['key_lengths']
+        self._longest_key_length = max(self._key_lengths or [0])
+
     def __len__(self):
         return self._dict.__len__()
         
@@ -50,20 +144,41 @@ class StenoDictionary(collections.MutableMapping):
                 raise KeyError('(%s, %s) is filtered' % (str(key), str(value)))
         return value
 
+    def get(self, key, default=None):
+        # Not through __getitem__, misses are common and exceptions are slow.
+        value = self._dict.get(key)
+        if value is None:
+            return default
+        for f in self.filters:
+            if f(key, value):
+                return default
+        return value
+
     def __setitem__(self, key, value):
-        self._longest_key = max(self._longest_key, len(key))
+        old_value = self._dict.get(key)
+        if key not in self._dict:
+            _add_prefixes(self._prefixes, key)
+            _add_length(self._key_lengths, key)
+            self._longest_key = max(self._longest_key, len(key))
         self._dict.__setitem__(key, value)
-        self.reverse[value].append(key)
+        self.generation += 1
+        if self._reverse is not None:
+            if old_value is not None:
+                self._reverse[old_value].remove(key)
+            self._reverse[value].append(key)
+        self._notify_entry_listeners(key, old_value, value)
 
     def __delitem__(self, key):
         value = self._dict[key]
-        self.reverse[value].remove(key)
+        if self._reverse is not None:
+            self._reverse[value].remove(key)
         self._dict.__delitem__(key)
-        if len(key) == self.longest_key:
-            if self._dict:
-                self._longest_key = max(len(x) for x in self._dict.iterkeys())
-            else:
-                self._longest_key = 0
+        self.generation += 1
+        _remove_prefixes(self._prefixes, key)
+        if not _remove_length(self._key_lengths, key):
+            if len(key) == self.longest_key:
+                self._longest_key = max(self._key_lengths or [0])
+        self._notify_entry_listeners(key, value, None)
 
     def __contains__(self, key):
         contained = self._dict.__contains__(key)
@@ -75,6 +190,34 @@ class StenoDictionary(collections.MutableMapping):
                 return False
         return True
 
+    @property
+    def reverse(self):
+        """A mapping from translations to lists of keys."""
+        if self._reverse is not None:
+            return self._reverse
+        reverse = collections.defaultdict(list)
+        for key, value in self._dict.iteritems():
+            reverse[value].append(key)
+        if self._reverse_enabled:
+            self._reverse = reverse
+        return reverse
+
+    def reverse_lookup(self, value):
+        """Return a list of the keys that map to value."""
+        if self._reverse is None and not self._reverse_enabled:
+            return [k for k, v in self._dict.iteritems() if v == value]
+        return list(self.reverse.get(value, ()))
+
+    def set_reverse_index_enabled(self, enabled):
+        """Allow or prevent keeping a reverse index in memory."""
+        self._reverse_enabled = enabled
+        if not enabled:
+            self._reverse = None
+
+    def has_prefix(self, key):
+        """Whether key is a proper prefix of any key in the dictionary."""
+        return key in self._prefixes
+
     def set_path(self, path):
         self._path = path    
 
@@ -108,61 +251,415 @@ class StenoDictionary(collections.MutableMapping):
     def remove_longest_key_listener(self, callback):
         self._longest_listener_callbacks.remove(callback)
 
+    def add_entry_listener(self, callback):
+        """Call callback(dictionary, key, old_value, new_value) on changes.
+
+        A value of None means the key was absent before or is absent after. A
+        key of None means that any lookup may have a different result, such as
+        after a filter change.
+
+        """
+        self._entry_listener_callbacks.add(callback)
+
+    def remove_entry_listener(self, callback):
+        self._entry_listener_callbacks.remove(callback)
+
+    def _notify_entry_listeners(self, key, old_value, new_value):
+        for callback in self._entry_listener_callbacks:
+            callback(self, key, old_value, new_value)
+
     def add_filter(self, f):
         self.filters.append(f)
+        self.generation += 1
+        self._notify_entry_listeners(None, None, None)
         
     def remove_filter(self, f):
         self.filters.remove(f)
+        self.generation += 1
+        self._notify_entry_listeners(None, None, None)
     
     def raw_get(self, key, default):
         """Bypass filters."""
         return self._dict.get(key, default)
 
 
+def _add_prefixes(prefixes, key):
+    for i in xrange(1, len(key)):
+        prefix = key[:i]
+        prefixes[prefix] = prefixes.get(prefix, 0) + 1
+
+def _remove_prefixes(prefixes, key):
+    for i in xrange(1, len(key)):
+        prefix = key[:i]
+        count = prefixes[prefix] - 1
+        if count:
+            prefixes[prefix] = count
+        else:
+            del prefixes[prefix]
+
+
+def _add_length(lengths, key):
+    n = len(key)
+    lengths[n] = lengths.get(n, 0) + 1
+
+def _remove_length(lengths, key):
+    """Returns the number of keys left with the same length as key."""
+    n = len(key)
+    count = lengths[n] - 1
+    if count:
+        lengths[n] = count
+    else:
+        del lengths[n]
+    return count
+
+
 class StenoDictionaryCollection(object):
+    """An ordered stack of dictionaries looked up as one.
+
+    The last dictionary given to set_dicts has the highest priority. To keep
+    lookups independent of the number of dictionaries, the collection keeps a
+    merged index mapping each key to its (translation, dictionary) pair in the
+    highest priority dictionary that has a non-empty translation for it. The
+    index is updated incrementally as the dictionaries change, as are the
+    combined prefix and key length counts of all the dictionaries' keys.
+
+    Dictionaries that are not held in memory, such as those served from disk,
+    are left out of the index and asked directly, but only when they have a
+    higher priority than the indexed entry for a key. Keys that none of the
+    dictionaries asked have are remembered until one of the dictionaries
+    changes, as most lookups are for keys that are not there.
+
+    Dictionaries can also be added one at a time as they finish loading, see
+    set_loading.
+
+    """
     def __init__(self):
         self.dicts = []
         self.filters = []
         self.longest_key = 0
         self.longest_key_callbacks = set()
+        self._index = {}
+        self._prefixes = {}
+        self._key_lengths = {}
+        self._ranks = {}
+        self._external = []
+        self._slots = []
+        self._load_states = {}
+        self._load_errors = {}
+        self._load_listeners = set()
+        # Goes up whenever lookups may have a different result: on changes to
+        # the dictionaries in the collection, their entries and the filters.
+        self.generation = 0
+        self._misses = set()
+        self._misses_generation = None
+        self._miss_cache_hits = 0
+        self._miss_cache_misses = 0
 
     def set_dicts(self, dicts):
         for d in self.dicts:
-            d.remove_longest_key_listener(self._longest_key_listener)
+            d.remove_entry_listener(self._entry_listener)
         self.dicts = dicts[:]
         self.dicts.reverse()
         for d in dicts:
-            d.add_longest_key_listener(self._longest_key_listener)
-        self._longest_key_listener()
+            d.add_entry_listener(self._entry_listener)
+        self._slots = [d.get_path() for d in dicts]
+        self._load_states = dict((path, LOADED) for path in self._slots)
+        self._load_errors = {}
+        self.generation += 1
+        self._misses.clear()
+        # Higher priority dictionaries have lower ranks.
+        self._ranks = dict((id(d), i) for i, d in enumerate(self.dicts))
+        self._rebuild_index()
+        self._update_longest_key()
+
+    def set_loading(self, paths):
+        """Empty the collection and wait for the dictionaries in paths.
+
+        The paths are in the same order as for set_dicts. Each dictionary is
+        used as soon as it is passed to add_loaded_dict, with the priority of
+        its position in paths.
+
+        """
+        self.set_dicts([])
+        self._slots = paths[:]
+        self._load_states = dict((path, LOADING) for path in paths)
+        for path in paths:
+            self._notify_load_listeners(path)
+
+    def add_loaded_dict(self, d):
+        """Start using a dictionary that was waited for by set_loading.
+
+        Returns False if the dictionary's path was not being waited for.
+
+        """
+        path = d.get_path()
+        if self._load_states.get(path) != LOADING:
+            return False
+        # Higher priority dictionaries have lower ranks, as in self.dicts.
+        rank = len(self._slots) - 1 - self._slots.index(path)
+        position = 0
+        for other in self.dicts:
+            if self._ranks[id(other)] > rank:
+                break
+            position += 1
+        self.dicts.insert(position, d)
+        self.generation += 1
+        self._ranks[id(d)] = rank
+        d.add_entry_listener(self._entry_listener)
+        if d.in_memory:
+            self._merge_into_index(d, rank)
+        else:
+            self._external.append((rank, d))
+            self._external.sort(key=lambda x: x[0])
+        self._load_states[path] = LOADED
+        self._update_longest_key()
+        self._notify_load_listeners(path)
+        return True
+
+    def replace_dict(self, old, new):
+        """Use new instead of old, such as a new copy of the same file.
+
+        new takes old's priority, and dictionaries still being waited for by
+        set_loading are still used when they finish. Returns False if old is
+        not in the collection.
+
+        """
+        for position, d in enumerate(self.dicts):
+            if d is old:
+                break
+        else:
+            return False
+        old.remove_entry_listener(self._entry_listener)
+        self.dicts[position] = new
+        self._ranks[id(new)] = self._ranks.pop(id(old))
+        new.add_entry_listener(self._entry_listener)
+        self.generation += 1
+        self._rebuild_index()
+        self._update_longest_key()
+        return True
+
+    def set_load_failed(self, path, exception):
+        """Record that a dictionary waited for by set_loading failed."""
+        if self._load_states.get(path) != LOADING:
+            return
+        self._load_states[path] = FAILED
+        self._load_errors[path] = exception
+        self._notify_load_listeners(path)
+
+    def get_load_states(self):
+        """Return a list of (path, state) in the order given."""
+        return [(path, self._load_states[path]) for path in self._slots]
+
+    def get_load_error(self, path):
+        return self._load_errors.get(path)
+
+    def get_load_progress(self):
+        """Return the fraction of the dictionaries that finished loading."""
+        if not self._slots:
+            return 1.0
+        done = sum(1 for state in self._load_states.itervalues()
+                   if state != LOADING)
+        return float(done) / len(self._load_states)
+
+    def add_load_listener(self, callback):
+        """Call callback(path, state) when a dictionary's load state changes."""
+        self._load_listeners.add(callback)
+
+    def remove_load_listener(self, callback):
+        self._load_listeners.remove(callback)
+
+    def _notify_load_listeners(self, path):
+        state = self._load_states[path]
+        for callback in self._load_listeners:
+            callback(path, state)
 
     def lookup(self, key):
-        for d in self.dicts:
-            value = d.get(key, None)
-            if value:
-                for f in self.filters:
-                    if f(key, value):
-                        return None
-                return value
+        value = self._indexed_get(key)
+        if value:
+            for f in self.filters:
+                if f(key, value):
+                    return None
+            return value
 
     def raw_lookup(self, key):
+        return self._indexed_get(key)
+
+    def lookup_many(self, keys):
+        """Return the first of keys that has a translation.
+
+        Arguments:
+
+        keys -- Keys in order of preference, such as every outline that a new
+        stroke could complete, longest first.
+
+        Returns a (key, translation, dictionary) tuple, or None if none of the
+        keys have a translation. Keys of more than one stroke are skipped
+        without a lookup when their leading strokes are not a prefix of any
+        key.
+
+        """
+        filters = self.filters
+        for key in keys:
+            if len(key) > 1 and not self.has_prefix(key[:-1]):
+                continue
+            entry = self._indexed_entry(key)
+            if entry is None:
+                continue
+            value, d = entry
+            for f in filters:
+                if f(key, value):
+                    break
+            else:
+                return key, value, d
+        return None
+
+    def get_miss_cache_info(self):
+        """Return how many lookups were answered by the cache of missing keys.
+
+        Only lookups that would have to ask dictionaries directly use the cache;
+        the others count as neither hits nor misses.
+
+        """
+        return MissCacheInfo(self._miss_cache_hits, self._miss_cache_misses,
+                             MISS_CACHE_SIZE, len(self._misses))
+
+    def _indexed_get(self, key):
+        entry = self._indexed_entry(key)
+        return None if entry is None else entry[0]
+
+    def _indexed_entry(self, key):
+        """Return the (translation, dictionary) pair for key or None."""
+        entry = self._index.get(key)
+        if not self._external and (entry is None or not entry[1].filters):
+            return entry
+        misses = self._misses
+        generation = self.generation
+        if generation != self._misses_generation:
+            misses.clear()
+            self._misses_generation = generation
+        if key in misses:
+            self._miss_cache_hits += 1
+            return None
+        self._miss_cache_misses += 1
+        entry = self._ask_dicts(key, entry)
+        if entry is None:
+            if len(misses) >= MISS_CACHE_SIZE:
+                misses.clear()
+            misses.add(key)
+        return entry
+
+    def _ask_dicts(self, key, entry):
+        if self._external:
+            rank = None if entry is None else self._ranks[id(entry[1])]
+            for external_rank, d in self._external:
+                if rank is not None and external_rank > rank:
+                    break
+                value = d.get(key, None)
+                if value:
+                    return value, d
+        if entry is None or not entry[1].filters:
+            return entry
+        # Dictionary level filters can hide the indexed entry so fall back to
+        # asking each dictionary in turn.
         for d in self.dicts:
             value = d.get(key, None)
             if value:
-                return value
+                return value, d
+        return None
+
+    def has_prefix(self, key):
+        """Whether key is a proper prefix of a key in any dictionary.
+
+        This ignores filters so it may report prefixes of hidden entries.
+
+        """
+        if key in self._prefixes:
+            return True
+        for rank, d in self._external:
+            if d.has_prefix(key):
+                return True
+        return False
+
+    def _rebuild_index(self):
+        index = {}
+        prefixes = {}
+        lengths = {}
+        self._external = [(self._ranks[id(d)], d) for d in self.dicts
+                          if not d.in_memory]
+        for d in reversed(self.dicts):
+            if not d.in_memory:
+                continue
+            index.update((k, (v, d)) for k, v in d.iteritems() if v)
+            for prefix, count in d._prefixes.iteritems():
+                prefixes[prefix] = prefixes.get(prefix, 0) + count
+            for n, count in d._key_lengths.iteritems():
+                lengths[n] = lengths.get(n, 0) + count
+        self._index = index
+        self._prefixes = prefixes
+        self._key_lengths = lengths
+
+    def _merge_into_index(self, d, rank):
+        index = self._index
+        ranks = self._ranks
+        for k, v in d.iteritems():
+            if not v:
+                continue
+            entry = index.get(k)
+            if entry is None or ranks[id(entry[1])] > rank:
+                index[k] = (v, d)
+        prefixes = self._prefixes
+        for prefix, count in d._prefixes.iteritems():
+            prefixes[prefix] = prefixes.get(prefix, 0) + count
+        lengths = self._key_lengths
+        for n, count in d._key_lengths.iteritems():
+            lengths[n] = lengths.get(n, 0) + count
+
+    def _entry_listener(self, dictionary, key, old_value, new_value):
+        self.generation += 1
+        if key is None or not dictionary.in_memory:
+            # Only the entries of indexed dictionaries are counted in the
+            # prefixes and key lengths, the others are asked for theirs.
+            self._update_longest_key()
+            return
+        if old_value is None:
+            _add_prefixes(self._prefixes, key)
+            _add_length(self._key_lengths, key)
+            if len(key) > self.longest_key:
+                self._update_longest_key()
+        elif new_value is None:
+            _remove_prefixes(self._prefixes, key)
+            if not _remove_length(self._key_lengths, key):
+                self._update_longest_key()
+        for d in self.dicts:
+            if not d.in_memory:
+                continue
+            value = d.raw_get(key, None)
+            if value:
+                self._index[key] = (value, d)
+                return
+        self._index.pop(key, None)
 
     def reverse_lookup(self, value):
         for d in self.dicts:
-            key = d.reverse.get(value, None)
+            key = d.reverse_lookup(value)
             if key:
                 return key
 
     def set(self, key, value):
-        if self.dicts:
-            self.dicts[0][key] = value
+        d = self.first_writable_dict()
+        if d is not None:
+            d[key] = value
 
     def save(self):
-        if self.dicts:
-            self.dicts[0].save()
+        d = self.first_writable_dict()
+        if d is not None:
+            d.save()
+
+    def first_writable_dict(self):
+        """The highest priority dictionary that is not read only."""
+        for d in self.dicts:
+            if not d.readonly:
+                return d
 
     def save_all(self):
         for dict in self.dicts:
@@ -175,9 +672,11 @@ class StenoDictionaryCollection(object):
 
     def add_filter(self, f):
         self.filters.append(f)
+        self.generation += 1
 
     def remove_filter(self, f):
         self.filters.remove(f)
+        self.generation += 1
 
     def add_longest_key_listener(self, callback):
         self.longest_key_callbacks.add(callback)
@@ -185,8 +684,10 @@ class StenoDictionaryCollection(object):
     def remove_longest_key_listener(self, callback):
         self.longest_key_callbacks.remove(callback)
     
-    def _longest_key_listener(self, ignored=None):
-        new_longest_key = max(d.longest_key for d in self.dicts)
+    def _update_longest_key(self):
+        new_longest_key = max(self._key_lengths or [0])
+        for rank, d in self._external:
+            new_longest_key = max(new_longest_key, d.longest_key)
         if new_longest_key != self.longest_key:
             self.longest_key = new_longest_key
             for c in self.longest_key_callbacks:
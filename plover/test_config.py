@@ -22,6 +22,12 @@ class ConfigTestCase(unittest.TestCase):
          'blee'),
         ('log_file_name', config.LOGGING_CONFIG_SECTION, config.LOG_FILE_OPTION, 
          config.DEFAULT_LOG_FILE, 'l1', 'log', 'sawzall'),
+        ('dictionary_loading_processes', config.DICTIONARY_LOADING_SECTION, 
+         config.DICTIONARY_LOADING_PROCESSES_OPTION, 
+         config.DEFAULT_DICTIONARY_LOADING_PROCESSES, 1, 2, 4),
+        ('progressive_dictionary_loading', config.DICTIONARY_LOADING_SECTION, 
+         config.DICTIONARY_LOADING_PROGRESSIVE_OPTION, 
+         config.DEFAULT_DICTIONARY_LOADING_PROGRESSIVE, True, False, True),
         ('enable_stroke_logging', config.LOGGING_CONFIG_SECTION, 
          config.ENABLE_STROKE_LOGGING_OPTION, 
          config.DEFAULT_ENABLE_STROKE_LOGGING, False, True, False),
@@ -37,6 +43,12 @@ class ConfigTestCase(unittest.TestCase):
         ('space_placement', config.OUTPUT_CONFIG_SECTION, 
          config.OUTPUT_CONFIG_SPACE_PLACEMENT_OPTION, config.DEFAULT_OUTPUT_CONFIG_SPACE_PLACEMENT, 
          'Before Output', 'After Output', 'None'),
+        ('suffix_fold_keys', config.TRANSLATION_CONFIG_SECTION, 
+         config.SUFFIX_FOLD_KEYS_OPTION, config.DEFAULT_SUFFIX_FOLD_KEYS, 
+         '-Z', '-D -Z', '-S -G'),
+        ('prefix_fold_keys', config.TRANSLATION_CONFIG_SECTION, 
+         config.PREFIX_FOLD_KEYS_OPTION, config.DEFAULT_PREFIX_FOLD_KEYS, 
+         'S-', 'S- T-', 'K-'),
         ('stroke_display_on_top', config.STROKE_DISPLAY_SECTION, 
          config.STROKE_DISPLAY_ON_TOP_OPTION, 
          config.DEFAULT_STROKE_DISPLAY_ON_TOP, False, True, False),
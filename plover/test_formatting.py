@@ -204,6 +204,13 @@ class FormatterTestCase(unittest.TestCase):
         self.assertEqual(action(text='test'), action(text='test'))
         self.assertEqual(action(text='test', word='test').copy_state(),
                          action(word='test'))
+        fields = dict(attach=True, glue=True, word='w', capitalize=True, 
+                      lower=True, orthography=False, text='t', replace='r', 
+                      combo='c', command='e')
+        for name, value in fields.items():
+            self.assertNotEqual(action(**{name: value}), action())
+        self.assertEqual(action(**fields), action(**fields))
+        self.assertFalse(hasattr(action(), '__dict__'))
 
     def test_translation_to_actions(self):
         cases = [
@@ -0,0 +1,76 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Unit tests for interning.py."""
+
+import unittest
+import interning
+from interning import intern_translation, intern_translations, sharing
+from interning import memory_report
+from steno_dictionary import StenoDictionary
+
+def copy(s):
+    return s[:1] + s[1:]
+
+class InterningTestCase(unittest.TestCase):
+
+    def test_intern_translation(self):
+        with sharing():
+            a = intern_translation(copy('word'))
+            self.assertIs(intern_translation(copy('word')), a)
+            u = intern_translation(copy(u'word'))
+            self.assertIs(type(u), unicode)
+            self.assertIs(intern_translation(copy(u'word')), u)
+            self.assertEqual(intern_translation(None), None)
+        # Nothing is kept outside of sharing().
+        self.assertIsNot(intern_translation(copy('word')), a)
+
+    def test_intern_translations(self):
+        with sharing():
+            a = intern_translation(copy(u'a'))
+            translations = intern_translations([copy(u'a'), copy(u'b'),
+                                                copy(u'b')])
+            self.assertEqual(translations, [u'a', u'b', u'b'])
+            self.assertIs(translations[0], a)
+            self.assertIs(translations[1], translations[2])
+            mixed = intern_translations([copy('a'), copy(u'a'), None])
+            self.assertEqual(map(type, mixed), [str, unicode, type(None)])
+            self.assertIs(mixed[1], a)
+
+    def test_pools_are_dropped(self):
+        with sharing():
+            with sharing():
+                a = intern_translation(copy('word'))
+            self.assertIs(intern_translation(copy('word')), a)
+        self.assertIsNone(interning._pools)
+
+    def test_dictionaries_share_entries(self):
+        with sharing():
+            d1 = StenoDictionary.from_pairs([(('S', 'T'), copy('st'))])
+            d2 = StenoDictionary.from_pairs([(('S', 'T'), copy('st')),
+                                             (('T',), copy('t')),
+                                             (('T', 'T'), copy('t'))])
+        self.assertIs(d1[('S', 'T')], d2[('S', 'T')])
+        self.assertIs(d2[('T',)], d2[('T', 'T')])
+        report = memory_report([d1, d2])
+        self.assertEqual(report.entries, 4)
+        self.assertLess(report.bytes, report.unshared_bytes)
+        # Reports made while loading count the pools too.
+        with sharing():
+            intern_translation(copy('st'))
+            self.assertGreater(memory_report([d1, d2]).bytes, report.bytes)
+
+    def test_state_shares_translations(self):
+        d = StenoDictionary.from_pairs([(('S',), u'a'), (('T',), copy(u'a')),
+                                        (('P',), 'b'), (('H',), u'b')])
+        copied = StenoDictionary.__new__(StenoDictionary)
+        copied.__setstate__(d.__getstate__())
+        self.assertEqual(copied._dict, d._dict)
+        self.assertEqual(type(copied[('P',)]), str)
+        self.assertEqual(type(copied[('H',)]), unicode)
+        d = StenoDictionary.from_pairs([(('S',), u'a'), (('T',), copy(u'a'))])
+        copied.__setstate__(d.__getstate__())
+        self.assertIs(copied[('S',)], copied[('T',)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,8 @@
 """Unit tests for steno.py."""
 
 import unittest
-from steno import normalize_steno, Stroke
+import steno
+from steno import normalize_steno, Stroke, keys_to_mask, mask_to_keys
 
 class StenoTestCase(unittest.TestCase):
     def test_normalize_steno(self):
@@ -18,10 +19,37 @@ class StenoTestCase(unittest.TestCase):
         ('-ES', 'ES'),
         ('TW-EPBL', 'TWEPBL'),
         ('TWEPBL', 'TWEPBL'),
+        ('#S', '#S'),
+        ('#1', '1'),
+        ('1#-', '1'),
+        ('#-T', '#-T'),
+        ('#A', '#A'),
+        ('#0-', '0'),
+        ('S*-T', 'S*T'),
+        ('S-/-T/', 'S/-T/'),
         )
         
         for arg, expected in cases:
             self.assertEqual('/'.join(normalize_steno(arg)), expected)
+            # Again from the cache.
+            self.assertEqual('/'.join(normalize_steno(arg)), expected)
+
+    def test_normalize_cache(self):
+        steno.clear_normalize_cache()
+        self.assertEqual(normalize_steno('S-/T-/S-'), ('S', 'T', 'S'))
+        info = steno.normalize_cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 2, 2))
+        normalize_steno('T-')
+        self.assertEqual(steno.normalize_cache_info().hits, 2)
+        old_size = steno.NORMALIZE_CACHE_SIZE
+        steno.NORMALIZE_CACHE_SIZE = 2
+        try:
+            self.assertEqual(normalize_steno('-P'), ('-P',))
+            self.assertEqual(steno.normalize_cache_info().currsize, 1)
+        finally:
+            steno.NORMALIZE_CACHE_SIZE = old_size
+        steno.clear_normalize_cache()
+        self.assertEqual(steno.normalize_cache_info(), (0, 0, old_size, 0))
             
     def test_steno(self):
         self.assertEqual(Stroke(['S-']).rtfcre, 'S')
@@ -29,6 +57,41 @@ class StenoTestCase(unittest.TestCase):
         self.assertEqual(Stroke(['T-', 'S-']).rtfcre, 'ST')
         self.assertEqual(Stroke(['-P', '-P']).rtfcre, '-P')
         self.assertEqual(Stroke(['-P', 'X-']).rtfcre, 'X-P')
+        self.assertEqual(Stroke(['#', 'S-', '-T']).rtfcre, '1-9')
+        self.assertEqual(Stroke(['#', 'K-']).rtfcre, '#K')
+        self.assertEqual(Stroke(['#', 'S-', '-T']).steno_keys, ('1-', '-9'))
+
+    def test_from_keys(self):
+        s = Stroke.from_keys(['S-', '-T', 'S-'])
+        self.assertIs(Stroke.from_keys(['-T', 'S-']), s)
+        self.assertEqual(s, Stroke(['S-', '-T']))
+        self.assertEqual(s.rtfcre, 'S-T')
+        # Shared strokes can't be changed through their keys.
+        self.assertEqual(s.steno_keys, ('S-', '-T'))
+        self.assertEqual(Stroke.from_keys(['-P', 'X-']).steno_keys, 
+                         ('X-', '-P'))
+        self.assertIsNot(Stroke.from_keys(['S-']), s)
+        old_size = steno.STROKE_CACHE_SIZE
+        steno.STROKE_CACHE_SIZE = 1
+        try:
+            # Adding a stroke to a full cache empties it.
+            Stroke.from_keys(['-P'])
+            self.assertIsNot(Stroke.from_keys(['-T', 'S-']), s)
+        finally:
+            steno.STROKE_CACHE_SIZE = old_size
+
+    def test_keymask(self):
+        self.assertEqual(keys_to_mask([]), 0)
+        self.assertEqual(keys_to_mask(['#']), 1)
+        self.assertEqual(keys_to_mask(['S-', '-Z']), (1 << 1) | (1 << 22))
+        self.assertIsNone(keys_to_mask(['X-']))
+        self.assertEqual(mask_to_keys(keys_to_mask(['-Z', 'S-'])), ['S-', '-Z'])
+        self.assertIsNone(Stroke(['-P', 'X-']).keymask)
+        stroke = Stroke(['T-', '-E', 'S-'])
+        self.assertEqual(Stroke.from_mask(stroke.keymask), stroke)
+        self.assertEqual(Stroke.from_mask(stroke.keymask).rtfcre, 'STE')
+        self.assertNotEqual(Stroke(['S-']), Stroke(['-S']))
+        self.assertEqual(Stroke(['S-', 'S-']), Stroke(['S-']))
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
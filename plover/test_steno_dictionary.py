@@ -5,6 +5,7 @@
 
 import unittest
 from steno_dictionary import StenoDictionary, StenoDictionaryCollection
+from steno_dictionary import LOADING, LOADED, FAILED
 
 class StenoDictionaryTestCase(unittest.TestCase):
 
@@ -75,6 +76,281 @@ class StenoDictionaryTestCase(unittest.TestCase):
         dc.set(('S',), 'e')
         self.assertEqual(dc.lookup(('S',)), 'e')
         self.assertEqual(d2[('S',)], 'e')
+
+    def test_reverse_lookup(self):
+        d = StenoDictionary()
+        d[('S',)] = 'a'
+        d[('T',)] = 'a'
+        self.assertIsNone(d._reverse)
+        self.assertEqual(sorted(d.reverse_lookup('a')), [('S',), ('T',)])
+        self.assertIsNotNone(d._reverse)
+        d[('S',)] = 'b'
+        d[('P',)] = 'b'
+        del d[('T',)]
+        self.assertEqual(d.reverse_lookup('a'), [])
+        self.assertEqual(sorted(d.reverse_lookup('b')), [('P',), ('S',)])
+        d.set_reverse_index_enabled(False)
+        self.assertEqual(sorted(d.reverse_lookup('b')), [('P',), ('S',)])
+        self.assertIsNone(d._reverse)
+        d[('W',)] = 'b'
+        self.assertEqual(sorted(d.reverse_lookup('b')), [('P',), ('S',), ('W',)])
+        self.assertEqual(d.reverse_lookup('c'), [])
+        self.assertIsNone(d._reverse)
+
+    def test_collection_longest_key(self):
+        notifications = []
+        def listener(longest_key):
+            notifications.append(longest_key)
+        dc = StenoDictionaryCollection()
+        dc.add_longest_key_listener(listener)
+        d1 = StenoDictionary()
+        d1[('S', 'T')] = 'a'
+        d2 = StenoDictionary()
+        d2[('S', 'T', 'P')] = 'b'
+        d2[('P', 'T', 'S')] = 'c'
+        dc.set_dicts([d1, d2])
+        self.assertEqual(dc.longest_key, 3)
+        self.assertEqual(notifications, [3])
+        del d2[('S', 'T', 'P')]
+        self.assertEqual(notifications, [3])
+        d1[('P', 'T', 'S')] = 'd'
+        del d2[('P', 'T', 'S')]
+        self.assertEqual(notifications, [3])
+        self.assertEqual(d2.longest_key, 0)
+        del d1[('P', 'T', 'S')]
+        self.assertEqual(dc.longest_key, 2)
+        self.assertEqual(notifications, [3, 2])
+        d2[('S', 'T', 'P', 'H')] = 'e'
+        self.assertEqual(notifications, [3, 2, 4])
+        dc.set_dicts([])
+        self.assertEqual(dc.longest_key, 0)
+        self.assertEqual(notifications, [3, 2, 4, 0])
+
+    def test_progressive_loading(self):
+        def make_dict(path, entries):
+            d = StenoDictionary(entries)
+            d.set_path(path)
+            return d
+        low = make_dict('low', {('S',): 'low', ('T', 'P'): 'tp'})
+        middle = make_dict('middle', {('S',): 'middle', ('P',): 'p'})
+        high = make_dict('high', {('S',): 'high'})
+        states = []
+        def listener(path, state):
+            states.append((path, state))
+        dc = StenoDictionaryCollection()
+        dc.add_load_listener(listener)
+        dc.set_loading(['low', 'middle', 'high', 'broken'])
+        self.assertEqual(dc.get_load_progress(), 0.0)
+        self.assertEqual(dc.get_load_states(), [('low', LOADING), 
+            ('middle', LOADING), ('high', LOADING), ('broken', LOADING)])
+        self.assertTrue(dc.add_loaded_dict(middle))
+        self.assertEqual(dc.lookup(('S',)), 'middle')
+        self.assertEqual(dc.longest_key, 1)
+        self.assertTrue(dc.add_loaded_dict(low))
+        self.assertEqual(dc.lookup(('S',)), 'middle')
+        self.assertEqual(dc.lookup(('T', 'P')), 'tp')
+        self.assertEqual(dc.longest_key, 2)
+        self.assertTrue(dc.has_prefix(('T',)))
+        self.assertTrue(dc.add_loaded_dict(high))
+        self.assertEqual(dc.lookup(('S',)), 'high')
+        self.assertEqual(dc.dicts, [high, middle, low])
+        self.assertFalse(dc.add_loaded_dict(high))
+        self.assertFalse(dc.add_loaded_dict(make_dict('other', {})))
+        e = Exception('broken')
+        dc.set_load_failed('broken', e)
+        self.assertEqual(dc.get_load_error('broken'), e)
+        self.assertEqual(dc.get_load_progress(), 1.0)
+        self.assertEqual(dc.get_load_states(), [('low', LOADED), 
+            ('middle', LOADED), ('high', LOADED), ('broken', FAILED)])
+        self.assertEqual(states[4:], [('middle', LOADED), ('low', LOADED), 
+                                      ('high', LOADED), ('broken', FAILED)])
+        # Changes are still tracked for late arrivals.
+        del high[('S',)]
+        self.assertEqual(dc.lookup(('S',)), 'middle')
+
+    def test_replace_dict(self):
+        def make_dict(path, entries):
+            d = StenoDictionary(entries)
+            d.set_path(path)
+            return d
+        a = make_dict('a', {('S',): 'a'})
+        b = make_dict('b', {('S',): 'b', ('T',): 'b'})
+        c = make_dict('c', {('P',): 'c'})
+        dc = StenoDictionaryCollection()
+        dc.set_loading(['a', 'b', 'c', 'broken'])
+        dc.set_load_failed('broken', Exception('broken'))
+        self.assertTrue(dc.add_loaded_dict(a))
+        self.assertTrue(dc.add_loaded_dict(b))
+        new_b = make_dict('b', {('T', 'P'): 'new'})
+        self.assertTrue(dc.replace_dict(b, new_b))
+        self.assertFalse(dc.replace_dict(b, new_b))
+        self.assertEqual(dc.lookup(('S',)), 'a')
+        self.assertIsNone(dc.lookup(('T',)))
+        self.assertEqual(dc.lookup(('T', 'P')), 'new')
+        self.assertEqual(dc.longest_key, 2)
+        self.assertEqual(dc.get_load_states(), [('a', LOADED), ('b', LOADED),
+            ('c', LOADING), ('broken', FAILED)])
+        # Dictionaries still loading are used when they finish, with their
+        # priority.
+        self.assertTrue(dc.add_loaded_dict(c))
+        self.assertEqual(dc.lookup(('P',)), 'c')
+        self.assertEqual(dc.dicts, [c, new_b, a])
+        # The old copy's changes are no longer tracked, the new one's are.
+        b[('H',)] = 'old'
+        self.assertIsNone(dc.lookup(('H',)))
+        new_b[('H',)] = 'new'
+        self.assertEqual(dc.lookup(('H',)), 'new')
+
+    def test_prefixes(self):
+        d = StenoDictionary()
+        d[('S', 'T', 'P')] = 'a'
+        d[('S', 'T')] = 'b'
+        self.assertTrue(d.has_prefix(('S',)))
+        self.assertTrue(d.has_prefix(('S', 'T')))
+        self.assertFalse(d.has_prefix(('S', 'T', 'P')))
+        self.assertFalse(d.has_prefix(('T',)))
+        dc = StenoDictionaryCollection()
+        d2 = StenoDictionary()
+        d2[('T', 'P')] = 'c'
+        dc.set_dicts([d, d2])
+        self.assertTrue(dc.has_prefix(('S', 'T')))
+        self.assertTrue(dc.has_prefix(('T',)))
+        del d[('S', 'T', 'P')]
+        self.assertFalse(d.has_prefix(('S', 'T')))
+        self.assertFalse(dc.has_prefix(('S', 'T')))
+        self.assertTrue(dc.has_prefix(('S',)))
+        d[('S', 'T')] = 'd'
+        self.assertTrue(dc.has_prefix(('S',)))
+        del d[('S', 'T')]
+        self.assertFalse(dc.has_prefix(('S',)))
+        d2[('T', 'W')] = 'e'
+        del d2[('T', 'P')]
+        self.assertTrue(dc.has_prefix(('T',)))
+
+    def test_from_pairs(self):
+        pairs = [(('S',), 'a'), (('S', 'T', 'P'), 'b'), (('S', 'T'), 'c'),
+                 (('S',), 'd')]
+        d = StenoDictionary.from_pairs(iter(pairs))
+        expected = StenoDictionary()
+        expected.update(pairs)
+        self.assertEqual(d._dict, expected._dict)
+        self.assertEqual(d._dict[('S',)], 'd')
+        self.assertEqual(d._prefixes, expected._prefixes)
+        self.assertEqual(d._key_lengths, expected._key_lengths)
+        self.assertEqual(d.longest_key, 3)
+        self.assertEqual(d.reverse_lookup('c'), [('S', 'T')])
+        del d[('S', 'T', 'P')]
+        self.assertEqual(d.longest_key, 2)
+        self.assertEqual(StenoDictionary.from_pairs([]).longest_key, 0)
+
+    def test_dictionary_collection_index(self):
+        dc = StenoDictionaryCollection()
+        d1 = StenoDictionary()
+        d1[('S',)] = 'a'
+        d1[('T',)] = 'b'
+        d2 = StenoDictionary()
+        d2[('S',)] = 'c'
+        d2[('P',)] = ''
+        d1[('P',)] = 'd'
+        dc.set_dicts([d1, d2])
+        # Empty translations fall through to lower priority dictionaries.
+        self.assertEqual(dc.lookup(('P',)), 'd')
+        # Changes to member dictionaries are picked up.
+        d1[('W',)] = 'e'
+        self.assertEqual(dc.lookup(('W',)), 'e')
+        del d2[('S',)]
+        self.assertEqual(dc.lookup(('S',)), 'a')
+        d2[('S',)] = 'f'
+        self.assertEqual(dc.lookup(('S',)), 'f')
+        del d1[('T',)]
+        self.assertIsNone(dc.lookup(('T',)))
+        # Reordering changes the priority.
+        dc.set_dicts([d2, d1])
+        self.assertEqual(dc.lookup(('S',)), 'a')
+        # Dictionaries that are no longer in the collection are ignored.
+        dc.set_dicts([d1])
+        d2[('Z',)] = 'g'
+        self.assertIsNone(dc.lookup(('Z',)))
+        # Dictionary level filters are respected.
+        d1.add_filter(lambda k, v: v == 'a')
+        self.assertIsNone(dc.lookup(('S',)))
+        self.assertEqual(dc.lookup(('W',)), 'e')
+
+    def test_miss_cache(self):
+        asked = []
+        class External(StenoDictionary):
+            in_memory = False
+            def get(self, key, default=None):
+                asked.append(key)
+                return StenoDictionary.get(self, key, default)
+        external = External()
+        external[('S',)] = 'a'
+        d = StenoDictionary()
+        d[('T',)] = 'b'
+        dc = StenoDictionaryCollection()
+        dc.set_dicts([d, external])
+        self.assertIsNone(dc.lookup(('P',)))
+        self.assertIsNone(dc.lookup(('P',)))
+        self.assertEqual(asked, [('P',)])
+        self.assertEqual(dc.get_miss_cache_info(), (1, 1, 10000, 1))
+        self.assertEqual(dc.lookup(('S',)), 'a')
+        self.assertEqual(dc.get_miss_cache_info().currsize, 1)
+        # Any change to a dictionary forgets the misses.
+        d[('P',)] = 'c'
+        self.assertEqual(dc.lookup(('P',)), 'c')
+        del d[('P',)]
+        self.assertIsNone(dc.lookup(('P',)))
+        external[('P',)] = 'd'
+        self.assertEqual(dc.lookup(('P',)), 'd')
+        hide_d = lambda k, v: v == 'd'
+        external.add_filter(hide_d)
+        self.assertIsNone(dc.lookup(('P',)))
+        external.remove_filter(hide_d)
+        self.assertEqual(dc.lookup(('P',)), 'd')
+        dc.set_dicts([d])
+        self.assertEqual(dc.get_miss_cache_info().currsize, 0)
+        # Dictionaries that were taken out no longer count as changes.
+        generation = dc.generation
+        external[('W',)] = 'e'
+        self.assertEqual(dc.generation, generation)
+        d[('W',)] = 'f'
+        self.assertNotEqual(dc.generation, generation)
+        # Without dictionaries to ask, the index answers on its own.
+        self.assertIsNone(dc.lookup(('P',)))
+        self.assertEqual(dc.get_miss_cache_info().currsize, 0)
+
+    def test_lookup_many(self):
+        d1 = StenoDictionary()
+        d1[('S',)] = 'a'
+        d1[('T', 'S')] = 'b'
+        d2 = StenoDictionary()
+        d2[('P', 'T', 'S')] = 'c'
+        d2[('T', 'S')] = 'd'
+        dc = StenoDictionaryCollection()
+        dc.set_dicts([d1, d2])
+        keys = [('P', 'T', 'S'), ('T', 'S'), ('S',)]
+        self.assertEqual(dc.lookup_many(keys), (('P', 'T', 'S'), 'c', d2))
+        self.assertEqual(dc.lookup_many(keys[1:]), (('T', 'S'), 'd', d2))
+        self.assertEqual(dc.lookup_many([('W', 'S'), ('S',)]), 
+                         (('S',), 'a', d1))
+        self.assertIsNone(dc.lookup_many([('W', 'S'), ('W',)]))
+        self.assertIsNone(dc.lookup_many([]))
+        dc.add_filter(lambda k, v: v in ('c', 'd'))
+        self.assertEqual(dc.lookup_many(keys), (('S',), 'a', d1))
+        d2.add_filter(lambda k, v: v == 'd')
+        dc.filters = []
+        self.assertEqual(dc.lookup_many(keys[1:]), (('T', 'S'), 'b', d1))
+
+    def test_get(self):
+        d = StenoDictionary()
+        d[('S',)] = 'a'
+        d[('T',)] = ''
+        self.assertEqual(d.get(('S',)), 'a')
+        self.assertEqual(d.get(('T',)), '')
+        self.assertIsNone(d.get(('P',)))
+        self.assertEqual(d.get(('P',), 'b'), 'b')
+        d.add_filter(lambda k, v: v == 'a')
+        self.assertIsNone(d.get(('S',)))
         
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -8,6 +8,7 @@ import copy
 from mock import patch
 from steno_dictionary import StenoDictionary, StenoDictionaryCollection
 from translation import Translation, Translator, _State, _translate_stroke, _lookup
+from translation import Folding
 import unittest
 from plover.steno import Stroke, normalize_steno
 
@@ -105,11 +106,12 @@ class TranslatorTestCase(unittest.TestCase):
     def test_translate_calls_translate_stroke(self):
         t = Translator()
         s = stroke('S')
-        def check(stroke, state, dictionary, output):
+        def check(stroke, state, dictionary, output, folding):
             self.assertEqual(stroke, s)
             self.assertEqual(state, t._state)
             self.assertEqual(dictionary, t._dictionary)
             self.assertEqual(output, t._output)
+            self.assertEqual(folding, t._folding)
 
         with patch('plover.translation._translate_stroke', check) as _translate_stroke:
             t.translate(s)
@@ -586,6 +588,37 @@ class TranslateStrokeTestCase(unittest.TestCase):
         self.assertEqual(lt[0].english, None)
         self.translate(stroke('K-LG'))
         self.assertTranslations(lt)
+
+    def test_configured_fold_keys(self):
+        self.define('K-L', 'look')
+        self.define('-G', '{^ing}')
+        self.define('-Z', '{^s}')
+        folding = Folding(['-Z'])
+        _translate_stroke(stroke('K-LG'), self.s, self.dc, self.o, folding)
+        self.assertEqual(self.s.translations[-1].english, None)
+        _translate_stroke(stroke('K-LZ'), self.s, self.dc, self.o, folding)
+        self.assertEqual(self.s.translations[-1].english, 'look {^s}')
+
+    def test_prefix_folding(self):
+        self.define('TPHU', 'new')
+        self.define('TPHU/-L', 'null')
+        self.define('S', '{re^}')
+        folding = Folding([], ['S-'])
+        _translate_stroke(stroke('STPHU'), self.s, self.dc, self.o, folding)
+        self.assertEqual(self.s.translations[-1].english, '{re^} new')
+        _translate_stroke(stroke('-L'), self.s, self.dc, self.o, folding)
+        self.assertEqual(self.s.translations[-1].english, '{re^} null')
+        self.assertEqual(len(self.s.translations), 1)
+
+    def test_fold_translations_follow_changes(self):
+        self.define('K-L', 'look')
+        self.define('-G', '{^ing}')
+        folding = Folding()
+        _translate_stroke(stroke('K-LG'), self.s, self.dc, self.o, folding)
+        self.assertEqual(self.s.translations[-1].english, 'look {^ing}')
+        self.define('-G', '{^ed}')
+        _translate_stroke(stroke('K-LG'), self.s, self.dc, self.o, folding)
+        self.assertEqual(self.s.translations[-1].english, 'look {^ed}')
     
 
 if __name__ == '__main__':
@@ -45,6 +45,8 @@ class Translation(object):
 
     """
 
+    __slots__ = ('strokes', 'rtfcre', 'english', 'replaced', 'formatting')
+
     def __init__(self, outline, translation):
         """Create a translation by looking up strokes in a dictionary.
 
@@ -114,12 +116,18 @@ class Translator(object):
         self.set_dictionary(StenoDictionaryCollection())
         self._listeners = set()
         self._state = _State()
+        self._folding = Folding()
 
     def translate(self, stroke):
         """Process a single stroke."""
-        _translate_stroke(stroke, self._state, self._dictionary, self._output)
+        _translate_stroke(stroke, self._state, self._dictionary, self._output,
+                          self._folding)
         self._resize_translations()
 
+    def set_fold_keys(self, suffix_keys, prefix_keys=()):
+        """Set the keys that can be folded into strokes, see Folding."""
+        self._folding = Folding(suffix_keys, prefix_keys)
+
     def set_dictionary(self, d):
         """Set the dictionary."""
         callback = self._dict_callback
@@ -226,7 +234,7 @@ def has_undo(t):
             return True
     return False
 
-def _translate_stroke(stroke, state, dictionary, callback):
+def _translate_stroke(stroke, state, dictionary, callback, folding=None):
     """Process a stroke.
 
     See the class documentation for details of how Stroke objects
@@ -244,6 +252,9 @@ def _translate_stroke(stroke, state, dictionary, callback):
     translations to undo, a list of new translations, and the translation that
     is the context for the new translations.
 
+    folding -- The Folding used when no outline matches as stroked. Defaults
+    to folding the keys in SUFFIX_KEYS.
+
     """
     
     undo = []
@@ -270,7 +281,8 @@ def _translate_stroke(stroke, state, dictionary, callback):
             translation_count += 1
         translation_index = len(state.translations) - translation_count
         translations = state.translations[translation_index:]
-        t = _find_translation(translations, dictionary, stroke)
+        t = _find_translation(translations, dictionary, stroke, 
+                              folding or _default_folding)
         do.append(t)
         undo.extend(t.replaced)
     
@@ -280,50 +292,164 @@ def _translate_stroke(stroke, state, dictionary, callback):
 
 SUFFIX_KEYS = ['-S', '-G', '-Z', '-D']
 
-def _find_translation(translations, dictionary, stroke):
-    t = _find_translation_helper(translations, dictionary, stroke, [])
-    if t:
-        return t
-    mapping = _lookup([stroke], dictionary, [])
-    if mapping is not None:  # Could be the empty string.
-        return Translation([stroke], mapping)
-    t = _find_translation_helper(translations, dictionary, stroke, SUFFIX_KEYS)
-    if t:
-        return t
-    return Translation([stroke], _lookup([stroke], dictionary, SUFFIX_KEYS))
-
-def _find_translation_helper(translations, dictionary, stroke, suffixes):
-    # The new stroke can either create a new translation or replace
-    # existing translations by matching a longer entry in the
-    # dictionary.
-    for i in xrange(len(translations)):
-        replaced = translations[i:]
-        strokes = list(itertools.chain(*[t.strokes for t in replaced]))
-        strokes.append(stroke)
-        mapping = _lookup(strokes, dictionary, suffixes)
-        if mapping != None:
-            t = Translation(strokes, mapping)
-            t.replaced = replaced
-            return t
+class Folding(object):
+    """Looks up outlines with affix keys folded into their strokes.
+
+    Writers can add a suffix key, such as -Z or -D, to the last stroke of an
+    outline instead of stroking the suffix on its own, or a prefix key to the
+    first stroke. Such an outline is translated by looking it up without the
+    key, looking up the key on its own and joining the translations.
+
+    The fold keys in a chord, and the chord without each of them, are worked
+    out the first time the chord is seen. The translations of the fold keys are
+    kept until the dictionary changes. Folding a stroke then costs a single
+    lookup_many call, whatever the number of fold keys and candidate outlines.
+
+    """
+
+    def __init__(self, suffix_keys=SUFFIX_KEYS, prefix_keys=()):
+        """Create a folding for the given keys, in order of preference.
+
+        Arguments:
+
+        suffix_keys -- Keys folded into the last stroke of an outline.
+
+        prefix_keys -- Keys folded into the first stroke of an outline.
+
+        """
+        self._suffixes = _fold_keys(suffix_keys)
+        self._prefixes = _fold_keys(prefix_keys)
+        self._suffix_variants = {}
+        self._prefix_variants = {}
+        self._dictionary = None
+        self._generation = None
+        self._fold_translations = {}
+
+    def find(self, dictionary, keys, first_strokes, last_stroke):
+        """Find the first of keys that translates with a key folded out.
+
+        Arguments:
+
+        dictionary -- The StenoDictionaryCollection to look up.
+
+        keys -- Candidate outlines in order of preference. They all end with
+        last_stroke.
+
+        first_strokes -- The first Stroke of each of the keys. Only needed for
+        prefix keys.
+
+        last_stroke -- The Stroke that ends all the keys.
+
+        Returns an (index in keys, translation) tuple or None.
+
+        """
+        suffixes = self._translated_variants(dictionary, self._suffixes,
+                                             self._suffix_variants,
+                                             last_stroke)
+        folded = []
+        matches = []
+        for i, key in enumerate(keys):
+            head = key[:-1]
+            for fold_translation, stripped in suffixes:
+                folded.append(head + (stripped,))
+                matches.append((i, None, fold_translation))
+            if not self._prefixes:
+                continue
+            tail = key[1:]
+            for fold_translation, stripped in self._translated_variants(
+                    dictionary, self._prefixes, self._prefix_variants,
+                    first_strokes[i]):
+                folded.append((stripped,) + tail)
+                matches.append((i, fold_translation, None))
+        if not folded:
+            return None
+        match = dictionary.lookup_many(folded)
+        if match is None:
+            return None
+        i, prefix, suffix = matches[folded.index(match[0])]
+        if suffix is not None:
+            return i, match[1] + ' ' + suffix
+        return i, prefix + ' ' + match[1]
+
+    def _translated_variants(self, dictionary, folds, cache, stroke):
+        """Return (fold key translation, stripped stroke) pairs for stroke."""
+        if stroke.keymask is None:
+            variants = _variants(folds, stroke)
+        else:
+            variants = cache.get(stroke.keymask)
+            if variants is None:
+                variants = cache[stroke.keymask] = _variants(folds, stroke)
+        if not variants:
+            return variants
+        generation = dictionary.generation
+        if dictionary is not self._dictionary or \
+           generation != self._generation:
+            self._fold_translations.clear()
+            self._dictionary = dictionary
+            self._generation = generation
+        translations = self._fold_translations
+        result = []
+        for fold, stripped in variants:
+            if fold not in translations:
+                translations[fold] = dictionary.lookup((fold,))
+            fold_translation = translations[fold]
+            if fold_translation is not None:
+                result.append((fold_translation, stripped))
+        return result
+
+def _fold_keys(keys):
+    return [(key, Stroke([key]).rtfcre) for key in keys]
+
+def _variants(folds, stroke):
+    """Return (fold key, stroke without it) RTF/CRE pairs for stroke."""
+    variants = []
+    for key, fold in folds:
+        if key in stroke.steno_keys:
+            keys = list(stroke.steno_keys)
+            keys.remove(key)
+            variants.append((fold, Stroke(keys).rtfcre))
+    return variants
+
+_default_folding = Folding()
+
+def _find_translation(translations, dictionary, stroke, folding):
+    # The new stroke can either create a new translation or replace existing
+    # translations by matching a longer entry in the dictionary. The outlines
+    # it can complete are the strokes of each tail of translations followed by
+    # the new stroke, and all of them are looked up at once, longest first.
+    key = (stroke.rtfcre,)
+    keys = [key]
+    for t in reversed(translations):
+        key = t.rtfcre + key
+        keys.append(key)
+    keys.reverse()
+    match = dictionary.lookup_many(keys)
+    if match is not None:
+        return _make_translation(translations, keys.index(match[0]), stroke, 
+                                 match[1])
+    # Then try again with fold keys folded out.
+    first_strokes = [t.strokes[0] for t in translations]
+    first_strokes.append(stroke)
+    match = folding.find(dictionary, keys, first_strokes, stroke)
+    if match is not None:
+        return _make_translation(translations, match[0], stroke, match[1])
+    return Translation([stroke], None)
+
+def _make_translation(translations, i, stroke, mapping):
+    """Translate the strokes of translations[i:] and stroke as mapping."""
+    strokes = list(itertools.chain(*[t.strokes for t in translations[i:]]))
+    strokes.append(stroke)
+    t = Translation(strokes, mapping)
+    t.replaced = translations[i:]
+    return t
 
 def _lookup(strokes, dictionary, suffixes):
     dict_key = tuple(s.rtfcre for s in strokes)
     result = dictionary.lookup(dict_key)
     if result != None:
         return result
-
-    for key in suffixes:
-        if key in strokes[-1].steno_keys:
-            dict_key = (Stroke([key]).rtfcre,)
-            suffix_mapping = dictionary.lookup(dict_key)
-            if suffix_mapping == None: continue
-            keys = strokes[-1].steno_keys[:]
-            keys.remove(key)
-            copy = strokes[:]
-            copy[-1] = Stroke(keys)
-            dict_key = tuple(s.rtfcre for s in copy)
-            main_mapping = dictionary.lookup(dict_key)
-            if main_mapping == None: continue
-            return main_mapping + ' ' + suffix_mapping
-
+    match = Folding(suffixes).find(dictionary, [dict_key], [strokes[0]],
+                                   strokes[-1])
+    if match is not None:
+        return match[1]
     return None